@@ -2,23 +2,218 @@
 """
 API Flask para desplegar el servicio - Versión final completa con correcciones
 """
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response, send_from_directory
+from flask.json.provider import DefaultJSONProvider
 import os
+import json
+import time
+import threading
 import tempfile
 import base64
-from .pdf_utils import extract_text_from_pdf, chunk_text, load_pdf_to_db
-import numpy as np
+from .pdf_utils import extract_text_from_pdf, chunk_text
+from .serving import apply_write
+from .retrieval_cache import RetrievalCache
+from .replication import SNAPSHOT_FILES, DELTA_EXTENSIONS, delta_filename
+from .summaries import SummaryStore, SummaryWorker, is_summary_query, format_summaries
+from .upload_store import ChunkedUploadStore, UploadOffsetError, UploadChecksumError
+from . import metrics
+from . import profiling
+from .metrics import stage, observe_stage
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Proveedor JSON de Flask que mide el parseo de peticiones y la serialización de respuestas"""
+    def loads(self, s, **kwargs):
+        with stage("request_parse"):
+            return super().loads(s, **kwargs)
+            
+    def dumps(self, obj, **kwargs):
+        with stage("json_serialization"):
+            return super().dumps(obj, **kwargs)
 
 class FlaskService:
-    def __init__(self, model_manager, vector_db, config):
+    # Endpoints que modifican la base de datos (rechazados en las réplicas)
+    WRITE_ENDPOINTS = {
+        "add_to_db", "upload_pdf", "upload_init", "upload_append",
+        "upload_complete", "clear_data", "clear_pdf"
+    }
+    
+    def __init__(self, model_manager, vector_db, config, loader=None, ingest_queue=None, replica=None):
         self.app = Flask(__name__)
+        self.app.json = TimedJSONProvider(self.app)
         self.model_manager = model_manager
         self.vector_db = vector_db
         self.config = config
+        # ComponentLoader cuando los componentes se cargan en segundo plano
+        self.loader = loader
+        # IngestQueue cuando las escrituras las aplica un proceso escritor separado
+        self.ingest_queue = ingest_queue
+        # Replica cuando este servicio sigue a un primario (solo lectura)
+        self.replica = replica
+        self.upload_store = ChunkedUploadStore(
+            config.UPLOAD_DIR,
+            buffer_size=config.UPLOAD_BUFFER_SIZE,
+            expiration=config.UPLOAD_EXPIRATION
+        )
+        
+        # Los workers de solo lectura recogen las versiones publicadas por el escritor
+        if self.ingest_queue is not None:
+            self.app.before_request(self._refresh_vector_db)
+        
+        # Métricas por petición y tamaño del índice
+        self.app.before_request(self._start_request_metrics)
+        self.app.after_request(self._finish_request_metrics)
+        self.app.teardown_request(self._teardown_request_metrics)
+        metrics.INDEX_DOCUMENTS.set_function(lambda: len(self.vector_db.documents))
+        metrics.INDEX_SOURCES.set_function(lambda: len(self.vector_db.sources))
+        
+        # Las réplicas no aceptan escrituras y exponen su retraso respecto al primario
+        if self.replica is not None:
+            self.app.before_request(self._reject_replica_writes)
+            metrics.REPLICATION_LAG_SECONDS.set_function(self.replica.lag_seconds)
+            metrics.REPLICATION_VERSIONS_BEHIND.set_function(self.replica.versions_behind)
+        
+        # Perfilado bajo demanda: los hooks solo se registran si está activado
+        if config.PROFILING_ENABLED:
+            profiling.enable_tracing()
+            self.app.before_request(self._start_profile)
+            self.app.after_request(self._finish_profile)
+        self.profiler_lock = threading.Lock()
+        
+        # Cachés de embeddings y resultados para consultas repetidas
+        self.retrieval_cache = RetrievalCache(config.QUERY_EMBEDDING_CACHE_SIZE, config.SEARCH_RESULT_CACHE_SIZE)
+        
+        # Resúmenes precalculados: se generan aquí salvo que las escrituras las
+        # aplique el proceso escritor (o un primario, en las réplicas)
+        self.summary_store = None
+        self.summarizer = None
+        if config.SUMMARIES_ENABLED:
+            self.summary_store = SummaryStore(config.SUMMARY_DIR)
+            if self.ingest_queue is None and self.replica is None:
+                self.summarizer = SummaryWorker(model_manager, vector_db, self.summary_store, config)
         
         # Definir rutas
         self.setup_routes()
         
+    def _start_request_metrics(self):
+        g.request_started = time.perf_counter()
+        metrics.REQUESTS_IN_FLIGHT.inc()
+        
+    def _finish_request_metrics(self, response):
+        started = g.get("request_started")
+        if started is not None:
+            endpoint = request.url_rule.rule if request.url_rule is not None else "desconocido"
+            metrics.HTTP_REQUEST_SECONDS.labels(endpoint, response.status_code).observe(
+                time.perf_counter() - started
+            )
+        return response
+        
+    def _teardown_request_metrics(self, exception):
+        # teardown se ejecuta también cuando la vista lanza una excepción
+        if g.pop("request_started", None) is not None:
+            metrics.REQUESTS_IN_FLIGHT.dec()
+        
+    def _reject_replica_writes(self):
+        if request.endpoint in self.WRITE_ENDPOINTS:
+            return jsonify({
+                "error": "Esta instancia es una réplica de solo lectura; envía las escrituras al primario",
+                "primary": self.replica.source_name
+            }), 403
+            
+    def _start_profile(self):
+        if request.headers.get("X-Profile") == "1" or request.args.get("profile") == "1":
+            profiling.start_trace()
+            
+    def _finish_profile(self, response):
+        trace = profiling.finish_trace()
+        if trace is not None:
+            response.headers["Server-Timing"] = trace.server_timing()
+            response.headers["X-Profile-Trace"] = json.dumps(
+                {"total_ms": trace.total_ms(), "stages": trace.stages},
+                separators=(",", ":")
+            )
+        return response
+        
+    def _retrieve(self, query, top_k, source_filter=None):
+        """Genera el embedding de la consulta y busca los fragmentos más similares"""
+        with stage("query_embedding"):
+            query_embedding = self.retrieval_cache.embedding(query, self.model_manager.generate_embeddings)
+            
+        # Los resultados en caché son posiciones dentro de esta instantánea concreta
+        snapshot = self.vector_db.snapshot()
+        hits = self.retrieval_cache.get_results(query_embedding, top_k, source_filter, snapshot.generation)
+        if hits is None:
+            hits = self.vector_db.search_hits(query_embedding, top_k, snapshot)
+            
+            # Filtrar por fuente si es necesario
+            if source_filter:
+                hits = [(idx, distance) for idx, distance in hits if source_filter.lower() in
+                        snapshot.documents[idx]["metadata"].get("source", "").lower()]
+            self.retrieval_cache.put_results(query_embedding, top_k, source_filter, snapshot.generation, hits)
+        return self.vector_db.results_from_hits(snapshot, hits)
+        
+    def _precomputed_summary(self, query, source_filter=None):
+        """
+        Resúmenes precalculados para preguntas del tipo "puntos principales del documento"
+        
+        Returns:
+            Lista de resúmenes de las fuentes consultadas, o None si la consulta no
+            pide un resumen o falta alguno (en ese caso se usa la búsqueda normal)
+        """
+        if self.summary_store is None or not is_summary_query(query):
+            return None
+            
+        sources = self.vector_db.sources
+        names = sorted(
+            name for name in sources
+            if not source_filter or source_filter.lower() in name.lower()
+        )
+        if not names or len(names) > self.config.SUMMARY_MAX_SOURCES:
+            return None
+            
+        summaries = [self.summary_store.get_valid(name, sources[name]) for name in names]
+        if any(summary is None for summary in summaries):
+            return None
+        return summaries
+        
+    def _refresh_vector_db(self):
+        # before_request no debe devolver valor para que la petición continúe
+        self.vector_db.reload_if_stale()
+        
+    def _write(self, operation, **payload):
+        """Aplica una escritura localmente o la delega al proceso escritor"""
+        if self.ingest_queue is not None:
+            result = self.ingest_queue.submit(operation, payload, timeout=self.config.INGEST_TIMEOUT)
+            # Ver de inmediato la versión que acaba de publicar el escritor
+            self.vector_db.reload_if_stale()
+            return result
+        return apply_write(operation, payload, self.model_manager, self.vector_db, self.summarizer)
+        
+    def _upload_dir(self):
+        """Directorio para los PDFs recibidos (compartido con el escritor si existe)"""
+        return self.ingest_queue.files_dir if self.ingest_queue is not None else None
+        
+    def _require(self, *components):
+        """
+        Espera a que los componentes indicados estén cargados.
+        Devuelve una respuesta 503 si alguno falló o no terminó a tiempo, o None si están listos.
+        """
+        if self.loader is None:
+            return None
+            
+        for name in components:
+            if not self.loader.wait(name, timeout=self.config.STARTUP_WAIT_TIMEOUT):
+                state = self.loader.state(name)
+                if state == self.loader.FAILED:
+                    message = f"El componente {name} no pudo cargarse: {self.loader.error(name)}"
+                else:
+                    message = f"El componente {name} todavía se está cargando"
+                return jsonify({
+                    "error": message,
+                    "component": name,
+                    "state": state
+                }), 503, {"Retry-After": "5"}
+        return None
+        
     def setup_routes(self):
         @self.app.route('/api/generate', methods=['POST'])
         def generate():
@@ -33,6 +228,10 @@ class FlaskService:
             if not prompt:
                 return jsonify({"error": "Se requiere un prompt"}), 400
                 
+            not_ready = self._require("llm")
+            if not_ready:
+                return not_ready
+                
             try:
                 response = self.model_manager.generate_response(
                     prompt, 
@@ -55,11 +254,13 @@ class FlaskService:
             if not text:
                 return jsonify({"error": "Se requiere texto para añadir a la base de datos"}), 400
                 
+            not_ready = self._require("embedding_model", "vector_db")
+            if not_ready:
+                return not_ready
+                
             try:
-                embedding = self.model_manager.generate_embeddings(text)
-                doc_id = self.vector_db.add_document(text, embedding, metadata)
-                self.vector_db.save()
-                return jsonify({"doc_id": doc_id, "status": "success"})
+                result = self._write("add_text", text=text, metadata=metadata)
+                return jsonify({"doc_id": result["doc_id"], "status": "success"})
             except Exception as e:
                 return jsonify({"error": str(e)}), 500
                 
@@ -75,9 +276,12 @@ class FlaskService:
             if not query:
                 return jsonify({"error": "Se requiere una consulta para buscar"}), 400
                 
+            not_ready = self._require("embedding_model", "vector_db")
+            if not_ready:
+                return not_ready
+                
             try:
-                query_embedding = self.model_manager.generate_embeddings(query)
-                results = self.vector_db.search(query_embedding, top_k)
+                results = self._retrieve(query, top_k)
                 
                 formatted_results = []
                 for result in results:
@@ -107,6 +311,10 @@ class FlaskService:
             
             También se puede enviar un archivo PDF usando form-data con el campo "pdf_file"
             """
+            not_ready = self._require("embedding_model", "vector_db")
+            if not_ready:
+                return not_ready
+                
             try:
                 # Verificar si se envió un archivo como form-data
                 if 'pdf_file' in request.files:
@@ -119,7 +327,8 @@ class FlaskService:
                         return jsonify({"error": "El archivo debe ser un PDF"}), 400
                     
                     # Guardar archivo en ubicación temporal
-                    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
+                    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf', dir=self._upload_dir())
+                    temp_file.close()
                     pdf_file.save(temp_file.name)
                     pdf_path = temp_file.name
                     filename = pdf_file.filename
@@ -143,7 +352,7 @@ class FlaskService:
                         return jsonify({"error": "Error al decodificar los datos base64"}), 400
                     
                     # Guardar PDF en archivo temporal
-                    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
+                    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf', dir=self._upload_dir())
                     temp_file.write(pdf_bytes)
                     temp_file.close()
                     pdf_path = temp_file.name
@@ -153,19 +362,21 @@ class FlaskService:
                 chunk_overlap = request.json.get('chunk_overlap', 200) if request.is_json else 200
                 
                 # Procesar el PDF
-                chunks_added = load_pdf_to_db(
-                    pdf_path, 
-                    self.model_manager, 
-                    self.vector_db, 
-                    chunk_size=chunk_size, 
-                    chunk_overlap=chunk_overlap
-                )
-                
-                # Eliminar el archivo temporal
                 try:
-                    os.unlink(pdf_path)
-                except Exception:
-                    pass
+                    result = self._write(
+                        "load_pdf",
+                        pdf_path=pdf_path,
+                        chunk_size=chunk_size,
+                        chunk_overlap=chunk_overlap,
+                        source_name=filename
+                    )
+                    chunks_added = result["chunks_added"]
+                finally:
+                    # Eliminar el archivo temporal
+                    try:
+                        os.unlink(pdf_path)
+                    except Exception:
+                        pass
                 
                 return jsonify({
                     "status": "success",
@@ -177,6 +388,119 @@ class FlaskService:
             except Exception as e:
                 return jsonify({"error": str(e)}), 500
         
+        @self.app.route('/api/pdf/upload/init', methods=['POST'])
+        def upload_init():
+            """
+            Inicia una subida de PDF por partes (reanudable)
+            
+            Request:
+            {
+                "filename": "documento.pdf",
+                "size": 1048576,
+                "sha256": "hash_sha256_del_archivo_en_hex",
+                "chunk_size": 1000,
+                "chunk_overlap": 200
+            }
+            
+            Después se envían los bytes con PUT /api/pdf/upload/<upload_id>?offset=N
+            y se finaliza con POST /api/pdf/upload/<upload_id>/complete
+            """
+            data = request.json or {}
+            filename = data.get('filename', 'documento.pdf')
+            
+            if not filename.lower().endswith('.pdf'):
+                return jsonify({"error": "El archivo debe ser un PDF"}), 400
+                
+            try:
+                upload = self.upload_store.create(
+                    filename,
+                    int(data.get('size', 0)),
+                    data.get('sha256', ''),
+                    options={
+                        "chunk_size": data.get('chunk_size', 1000),
+                        "chunk_overlap": data.get('chunk_overlap', 200)
+                    }
+                )
+                return jsonify(upload)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            except Exception as e:
+                return jsonify({"error": str(e)}), 500
+                
+        @self.app.route('/api/pdf/upload/<upload_id>', methods=['GET'])
+        def upload_status(upload_id):
+            """Estado de una subida por partes: offset indica desde dónde reanudar"""
+            try:
+                return jsonify(self.upload_store.status(upload_id))
+            except KeyError:
+                return jsonify({"error": "Subida no encontrada"}), 404
+                
+        @self.app.route('/api/pdf/upload/<upload_id>', methods=['PUT'])
+        def upload_append(upload_id):
+            """
+            Añade bytes a una subida por partes
+            
+            El cuerpo de la petición son los bytes del PDF (application/octet-stream),
+            que se escriben en disco a medida que llegan. El desplazamiento se indica
+            con el parámetro offset o la cabecera Upload-Offset y debe coincidir con
+            los bytes ya recibidos; si no, se responde 409 con el offset esperado.
+            """
+            offset = request.args.get('offset', request.headers.get('Upload-Offset'))
+            if offset is None or not str(offset).isdigit():
+                return jsonify({"error": "Se requiere el desplazamiento (offset) de los datos"}), 400
+                
+            try:
+                new_offset = self.upload_store.append(upload_id, int(offset), request.stream)
+                return jsonify({"upload_id": upload_id, "offset": new_offset})
+            except KeyError:
+                return jsonify({"error": "Subida no encontrada"}), 404
+            except UploadOffsetError as e:
+                return jsonify({"error": str(e), "offset": e.expected_offset}), 409
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            except Exception as e:
+                return jsonify({"error": str(e)}), 500
+                
+        @self.app.route('/api/pdf/upload/<upload_id>/complete', methods=['POST'])
+        def upload_complete(upload_id):
+            """Verifica el hash de una subida por partes y carga el PDF en la base de datos"""
+            not_ready = self._require("embedding_model", "vector_db")
+            if not_ready:
+                return not_ready
+                
+            try:
+                pdf_path, upload = self.upload_store.complete(upload_id)
+            except KeyError:
+                return jsonify({"error": "Subida no encontrada"}), 404
+            except UploadOffsetError as e:
+                return jsonify({"error": "La subida está incompleta", "offset": e.expected_offset}), 409
+            except UploadChecksumError as e:
+                return jsonify({"error": str(e), "offset": e.expected_offset}), 409
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+                
+            try:
+                result = self._write(
+                    "load_pdf",
+                    pdf_path=pdf_path,
+                    chunk_size=upload["options"].get("chunk_size", 1000),
+                    chunk_overlap=upload["options"].get("chunk_overlap", 200),
+                    source_name=upload["filename"]
+                )
+            except Exception as e:
+                # El PDF verificado se conserva: el cliente puede repetir complete
+                # con el mismo upload_id sin volver a enviar los datos
+                return jsonify({"error": str(e), "upload_id": upload_id, "retryable": True}), 500
+                
+            self.upload_store.discard(upload_id)
+            chunks_added = result["chunks_added"]
+            return jsonify({
+                "status": "success",
+                "filename": upload["filename"],
+                "chunks_added": chunks_added,
+                "message": f"PDF procesado: {chunks_added} fragmentos añadidos a la base de datos"
+            })
+        
         @self.app.route('/api/query-pdf', methods=['POST'])
         def query_pdf():
             """
@@ -204,15 +528,32 @@ class FlaskService:
             if not query:
                 return jsonify({"error": "Se requiere una consulta"}), 400
                 
+            not_ready = self._require("vector_db")
+            if not_ready:
+                return not_ready
+                
+            # Las preguntas de resumen se responden con los resúmenes precalculados
+            summaries = self._precomputed_summary(query, source_filter)
+            if summaries is not None:
+                # Sin fragmentos recuperados: "sources" queda vacía y los resúmenes
+                # usados van aparte para no cambiar la forma de sus elementos
+                return jsonify({
+                    "response": format_summaries(summaries),
+                    "sources": [],
+                    "summaries": [
+                        {"source": s["source"], "total_pages": s["total_pages"], "sections": s["sections"]}
+                        for s in summaries
+                    ],
+                    "precomputed": True
+                })
+                
+            not_ready = self._require("embedding_model", "llm")
+            if not_ready:
+                return not_ready
+                
             try:
                 # Buscar documentos relevantes
-                query_embedding = self.model_manager.generate_embeddings(query)
-                results = self.vector_db.search(query_embedding, top_k)
-                
-                # Filtrar por fuente si es necesario
-                if source_filter:
-                    results = [r for r in results if source_filter.lower() in 
-                              r["document"]["metadata"].get("source", "").lower()]
+                results = self._retrieve(query, top_k, source_filter)
                 
                 # Si no hay resultados, informar
                 if not results:
@@ -222,6 +563,7 @@ class FlaskService:
                     })
                 
                 # Construir contexto con los documentos encontrados
+                prompt_started = time.perf_counter()
                 context = ""
                 for i, result in enumerate(results):
                     source = result["document"]["metadata"].get("source", "Desconocido")
@@ -243,6 +585,7 @@ Basándote ÚNICAMENTE en la siguiente información:
 {context}
 
 Responde a esta pregunta: {query}"""
+                observe_stage("prompt_build", time.perf_counter() - prompt_started)
                 
                 # Generar respuesta
                 response = self.model_manager.generate_response(
@@ -294,15 +637,22 @@ Responde a esta pregunta: {query}"""
             if not query:
                 return jsonify({"error": "Se requiere una consulta"}), 400
                 
+            not_ready = self._require("vector_db")
+            if not_ready:
+                return not_ready
+                
+            # Las preguntas de resumen se responden con los resúmenes precalculados
+            summaries = self._precomputed_summary(query, source_filter)
+            if summaries is not None:
+                return jsonify({"response": format_summaries(summaries)})
+                
+            not_ready = self._require("embedding_model", "llm")
+            if not_ready:
+                return not_ready
+                
             try:
                 # Buscar documentos relevantes
-                query_embedding = self.model_manager.generate_embeddings(query)
-                results = self.vector_db.search(query_embedding, top_k)
-                
-                # Filtrar por fuente si es necesario
-                if source_filter:
-                    results = [r for r in results if source_filter.lower() in 
-                              r["document"]["metadata"].get("source", "").lower()]
+                results = self._retrieve(query, top_k, source_filter)
                 
                 # Si no hay resultados, informar
                 if not results:
@@ -311,6 +661,7 @@ Responde a esta pregunta: {query}"""
                     })
                 
                 # Construir contexto con los documentos encontrados
+                prompt_started = time.perf_counter()
                 context = ""
                 for i, result in enumerate(results):
                     source = result["document"]["metadata"].get("source", "Desconocido")
@@ -331,6 +682,7 @@ Basándote ÚNICAMENTE en la siguiente información:
 {context}
 
 Responde a esta pregunta: {query}"""
+                observe_stage("prompt_build", time.perf_counter() - prompt_started)
                 
                 # Generar respuesta
                 response = self.model_manager.generate_response(
@@ -349,43 +701,173 @@ Responde a esta pregunta: {query}"""
         def pdf_info():
             """
             Endpoint para obtener información sobre los PDFs cargados
+            
+            Usa el catálogo por fuente de la base de datos, por lo que el coste depende
+            del número de PDFs y no del número de fragmentos.
+            
+            Parámetros de consulta (opcionales):
+                offset: Número de PDFs a saltar (default: 0)
+                limit: Número máximo de PDFs a devolver (default: todos)
             """
-            try:
-                # Recopilar información de los PDFs
-                pdf_documents = {}
+            not_ready = self._require("vector_db")
+            if not_ready:
+                return not_ready
                 
-                for doc in self.vector_db.documents:
-                    metadata = doc["metadata"]
-                    source = metadata.get("source", "Unknown")
+            try:
+                offset = request.args.get('offset', 0, type=int)
+                limit = request.args.get('limit', None, type=int)
+                if offset < 0 or (limit is not None and limit < 0):
+                    return jsonify({"error": "offset y limit no pueden ser negativos"}), 400
                     
-                    # Solo considerar documentos de tipo PDF
-                    if metadata.get("type") == "pdf" or source.lower().endswith('.pdf'):
-                        if source in pdf_documents:
-                            pdf_documents[source]["chunks"] += 1
-                        else:
-                            pdf_documents[source] = {
-                                "chunks": 1,
-                                "example": doc["text"][:100] + "..." if len(doc["text"]) > 100 else doc["text"]
-                            }
+                total, sources = self.vector_db.list_sources(type_filter="pdf", offset=offset, limit=limit)
+                pdf_documents = {name: entry for name, entry in sources}
                 
                 return jsonify({
-                    "total_pdfs": len(pdf_documents),
+                    "total_pdfs": total,
+                    "offset": offset,
+                    "limit": limit,
                     "pdfs": pdf_documents
                 })
                 
             except Exception as e:
                 return jsonify({"error": str(e)}), 500
                 
+        @self.app.route('/api/pdf/summary', methods=['GET'])
+        def pdf_summary():
+            """
+            Resumen precalculado de un PDF (documento completo y por secciones)
+            
+            Parámetros de consulta:
+                pdf_name: Nombre del PDF
+            """
+            if self.summary_store is None:
+                return jsonify({"error": "Los resúmenes precalculados están desactivados (SUMMARIES_ENABLED)"}), 404
+                
+            pdf_name = request.args.get('pdf_name', '')
+            if not pdf_name:
+                return jsonify({"error": "Se requiere especificar pdf_name"}), 400
+                
+            not_ready = self._require("vector_db")
+            if not_ready:
+                return not_ready
+                
+            entry = self.vector_db.sources.get(pdf_name)
+            if entry is None:
+                return jsonify({"error": f"No se encontró el PDF: {pdf_name}"}), 404
+                
+            summary = self.summary_store.get_valid(pdf_name, entry)
+            if summary is None:
+                pending = self.summarizer.pending() if self.summarizer is not None else None
+                return jsonify({"status": "pending", "pdf_name": pdf_name, "queued_jobs": pending}), 202
+            return jsonify(dict(summary, status="ready"))
+            
         @self.app.route('/api/health', methods=['GET'])
         def health_check():
             """Endpoint para verificar el estado del servicio"""
-            return jsonify({
+            health = {
                 "status": "ok",
                 "model_loaded": self.model_manager.llm is not None,
                 "embedding_model_loaded": self.model_manager.embedding_model is not None,
-                "documents_count": len(self.vector_db.documents)
-            })
+                "documents_count": len(self.vector_db.documents),
+                "caches": self.retrieval_cache.stats()
+            }
+            
+            if self.replica is not None:
+                health["replication"] = self.replica.status()
+            
+            if self.loader is not None:
+                state = self.loader.overall_state()
+                health["status"] = {"ready": "ok", "loading": "loading", "failed": "degraded"}[state]
+                health["components"] = self.loader.status()
+                health["seconds_since_start"] = round(time.time() - self.loader.started_at, 3)
+                first_ready = self.loader.record_health_check()
+                health["startup_seconds"] = round(first_ready, 3) if first_ready is not None else None
+                
+            return jsonify(health)
+            
+        @self.app.route('/api/metrics', methods=['GET'])
+        def prometheus_metrics():
+            """Métricas del servicio en formato de texto de Prometheus"""
+            # Con --workers la ingesta la mide el proceso escritor
+            writer_metrics = self.ingest_queue.writer_metrics() if self.ingest_queue is not None else None
+            return Response(metrics.render(writer_metrics), mimetype="text/plain; version=0.0.4; charset=utf-8")
+            
+        @self.app.route('/api/ready', methods=['GET'])
+        def readiness_check():
+            """Sonda de disponibilidad: 200 cuando todos los componentes están listos, 503 si no"""
+            if self.loader is None or self.loader.all_ready():
+                return jsonify({"ready": True})
+            return jsonify({
+                "ready": False,
+                "components": self.loader.status()
+            }), 503
             
+        if self.config.ADMIN_PROFILER_ENABLED:
+            @self.app.route('/api/admin/profile', methods=['GET'])
+            def admin_profile():
+                """
+                Captura un perfil por muestreo de todos los hilos durante N segundos
+                
+                Query params:
+                    seconds: Duración de la captura (por defecto 10)
+                    
+                Devuelve las pilas en formato "folded" (flamegraph.pl, speedscope, inferno)
+                """
+                token = self.config.ADMIN_TOKEN
+                if token and request.headers.get("X-Admin-Token") != token:
+                    return jsonify({"error": "No autorizado"}), 403
+                    
+                try:
+                    seconds = float(request.args.get("seconds", 10))
+                except ValueError:
+                    return jsonify({"error": "seconds debe ser un número"}), 400
+                if not 0 < seconds <= self.config.PROFILER_MAX_SECONDS:
+                    return jsonify({
+                        "error": f"seconds debe estar entre 0 y {self.config.PROFILER_MAX_SECONDS}"
+                    }), 400
+                    
+                # Una sola captura a la vez por proceso
+                if not self.profiler_lock.acquire(blocking=False):
+                    return jsonify({"error": "Ya hay una captura en curso"}), 409
+                try:
+                    profiler = profiling.SamplingProfiler(self.config.PROFILER_INTERVAL)
+                    folded, samples = profiler.capture(seconds)
+                finally:
+                    self.profiler_lock.release()
+                    
+                filename = f"profile-{os.getpid()}-{int(time.time())}.folded"
+                return Response(folded, mimetype="text/plain; charset=utf-8", headers={
+                    "Content-Disposition": f'attachment; filename="{filename}"',
+                    "X-Profile-Samples": str(samples)
+                })
+                
+        # Exportación para réplicas que siguen a este primario por HTTP
+        if self.config.REPLICATION_DIR and self.replica is None:
+            replication_dir = os.path.abspath(self.config.REPLICATION_DIR)
+            
+            @self.app.route('/api/replication/head', methods=['GET'])
+            def replication_head():
+                """Versión actual del primario y última instantánea completa"""
+                return send_from_directory(replication_dir, "head.json", max_age=0)
+                
+            @self.app.route('/api/replication/snapshot/<int:version>/<name>', methods=['GET'])
+            def replication_snapshot(version, name):
+                """Archivo de una instantánea completa"""
+                if name not in SNAPSHOT_FILES:
+                    return jsonify({"error": f"Archivo desconocido: {name}"}), 404
+                return send_from_directory(
+                    os.path.join(replication_dir, "snapshots", f"v{version}"), name, max_age=0
+                )
+                
+            @self.app.route('/api/replication/delta/<int:version>.<extension>', methods=['GET'])
+            def replication_delta(version, extension):
+                """Cambios de la versión anterior a la indicada (JSON) y sus embeddings (.npy)"""
+                if extension not in DELTA_EXTENSIONS:
+                    return jsonify({"error": f"Archivo desconocido: {extension}"}), 404
+                return send_from_directory(
+                    os.path.join(replication_dir, "deltas"), delta_filename(version, extension), max_age=0
+                )
+                
         # ENDPOINTS PARA BORRAR DATOS - CORREGIDOS
         @self.app.route('/api/data/clear', methods=['POST'])
         def clear_data():
@@ -397,6 +879,10 @@ Responde a esta pregunta: {query}"""
                 "confirm": true
             }
             """
+            not_ready = self._require("vector_db")
+            if not_ready:
+                return not_ready
+                
             data = request.json or {}
             confirm = data.get('confirm', False)
             
@@ -408,16 +894,7 @@ Responde a esta pregunta: {query}"""
                 
             try:
                 # Usar el método clear_all de la clase VectorDatabase
-                self.vector_db.clear_all()
-                
-                # Verificación adicional para asegurar que se haya limpiado
-                if len(self.vector_db.documents) > 0:
-                    self.vector_db.documents = []
-                    self.vector_db.index = None
-                    self.vector_db.initialize_db()
-                
-                # Guardar la BD vacía explícitamente
-                self.vector_db.save()
+                self._write("clear_all")
                 
                 return jsonify({
                     "status": "success",
@@ -452,49 +929,26 @@ Responde a esta pregunta: {query}"""
                     "error": "El nombre del PDF no puede estar vacío"
                 }), 400
                 
-            try:
-                # Contar documentos antes de eliminar
-                total_before = len(self.vector_db.documents)
-                
-                # Filtrar documentos para conservar solo los que NO son del PDF especificado
-                filtered_documents = []
-                documents_to_remove = []
+            not_ready = self._require("vector_db")
+            if not_ready:
+                return not_ready
                 
-                for doc in self.vector_db.documents:
-                    source = doc["metadata"].get("source", "")
-                    if pdf_name.lower() not in source.lower():
-                        filtered_documents.append(doc)
-                    else:
-                        documents_to_remove.append(doc)
+            try:
+                # Eliminar los fragmentos del PDF y reconstruir el índice
+                result = self._write("remove_source", pdf_name=pdf_name)
+                removed_count = result["removed"]
                 
-                if not documents_to_remove:
+                if not removed_count:
                     return jsonify({
                         "status": "warning",
                         "message": f"No se encontraron documentos para el PDF: {pdf_name}"
                     })
                 
-                # Reconstruir la base de datos vectorial
-                removed_count = len(documents_to_remove)
-                self.vector_db.documents = filtered_documents
-                
-                # Recrear el índice con los documentos filtrados
-                self.vector_db.index = None
-                self.vector_db.initialize_db()
-                
-                # Añadir los documentos conservados al nuevo índice
-                for doc in filtered_documents:
-                    if "embedding" in doc:
-                        embedding_np = np.array([doc["embedding"]]).astype('float32')
-                        self.vector_db.index.add(embedding_np)
-                
-                # Guardar la base de datos actualizada
-                self.vector_db.save()
-                
                 return jsonify({
                     "status": "success",
                     "message": f"PDF eliminado: {pdf_name}",
                     "chunks_removed": removed_count,
-                    "remaining_documents": len(filtered_documents)
+                    "remaining_documents": result["remaining"]
                 })
                 
             except Exception as e:
@@ -507,5 +961,7 @@ Responde a esta pregunta: {query}"""
         self.app.run(
             host=self.config.HOST,
             port=self.config.PORT,
-            debug=self.config.DEBUG
+            debug=self.config.DEBUG,
+            # El recargador relanza el proceso y repetiría la carga en segundo plano
+            use_reloader=self.config.DEBUG and self.loader is None and self.replica is None
         )
\ No newline at end of file
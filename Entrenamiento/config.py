@@ -2,21 +2,111 @@
 """
 Configuración para el modelo, base de datos y servidor
 """
+import os
+import json
+
+# Parámetros que puede fijar el perfil generado por main.py --autotune
+TUNABLE_SETTINGS = (
+    "N_CTX", "N_THREADS", "N_THREADS_BATCH", "N_BATCH", "USE_MMAP", "USE_MLOCK",
+    "EMBEDDING_BATCH_SIZE", "TORCH_THREADS"
+)
 
 class Config:
     # Configuración del modelo Llama.cpp
     MODEL_PATH = "/home/nicolasrodrigeztorres04/.lmstudio/models/TheBloke/dolphin-2.6-mistral-7B-GGUF/dolphin-2.6-mistral-7b.Q4_K_S.gguf"
     N_CTX = 4096
     N_THREADS = 6
+    N_THREADS_BATCH = None  # Hilos para el prefill (None: igual que N_THREADS)
+    N_BATCH = 512  # Tokens del prompt procesados por lote en el prefill
+    USE_MMAP = True  # Leer los pesos con mmap (compartidos entre procesos)
+    USE_MLOCK = False  # Fijar los pesos en RAM para que el sistema no los descarte
     
     # Configuración de embeddings (modelo separado para embeddings)
     EMBEDDING_MODEL_PATH = "all-MiniLM-L6-v2"  # Modelo de embeddings de Sentence Transformers 
+    EMBEDDING_BATCH_SIZE = 32  # Fragmentos por lote al generar embeddings en la ingesta
+    TORCH_THREADS = None  # Hilos de torch para los embeddings (None: valor por defecto)
     
     # Configuración de la base de datos vectorial
     VECTOR_DB_PATH = "vector_database"
     VECTOR_DIMENSION = 384  # Dimensión para el modelo all-MiniLM-L6-v2
+    VECTOR_DB_MMAP = True  # Abrir el índice y los documentos con memory-mapping en los workers de solo lectura
     
     # Configuración del servidor Flask
     HOST = "0.0.0.0"
     PORT = 5000
-    DEBUG = True
\ No newline at end of file
+    DEBUG = True
+    
+    # Arranque rápido: segundos que una petición espera a que un componente
+    # termine de cargar antes de responder 503
+    STARTUP_WAIT_TIMEOUT = 30
+    
+    # Servicio de producción (main.py --serve --workers N)
+    WORKER_THREADS = 4  # Hilos por worker de gunicorn
+    WORKER_TIMEOUT = 600  # Segundos antes de reiniciar un worker bloqueado
+    INGEST_QUEUE_PATH = "ingest_queue"  # Cola en disco hacia el proceso escritor
+    INGEST_TIMEOUT = 600  # Segundos que un worker espera a que el escritor aplique una escritura
+    WRITER_HEARTBEAT_TIMEOUT = 15  # Segundos sin latido tras los que el escritor se da por caído
+    WRITER_RESTART_DELAY = 5  # Segundos mínimos entre reinicios del proceso escritor
+    
+    # Subidas de PDF por partes (reanudables)
+    UPLOAD_DIR = "uploads"
+    UPLOAD_BUFFER_SIZE = 64 * 1024  # Bytes leídos del cuerpo de la petición en cada bloque
+    UPLOAD_EXPIRATION = 24 * 3600  # Segundos sin actividad antes de descartar una subida
+    
+    # Perfilado bajo demanda (desactivado por defecto; sin coste cuando está apagado)
+    PROFILING_ENABLED = False  # Traza de etapas con la cabecera "X-Profile: 1" o ?profile=1
+    ADMIN_PROFILER_ENABLED = False  # Endpoint /api/admin/profile (muestreo de pilas)
+    ADMIN_TOKEN = None  # Si se define, /api/admin/* exige la cabecera X-Admin-Token
+    PROFILER_MAX_SECONDS = 60  # Duración máxima de una captura
+    PROFILER_INTERVAL = 0.005  # Segundos entre muestras
+    
+    # Cachés LRU de recuperación (0 para desactivarlas)
+    QUERY_EMBEDDING_CACHE_SIZE = 1024  # Texto de la consulta -> embedding
+    SEARCH_RESULT_CACHE_SIZE = 1024  # (embedding, top_k, filtro, versión de la BD) -> resultados
+    
+    # Replicación hacia réplicas de solo lectura
+    REPLICATION_DIR = None  # El primario exporta aquí instantáneas y deltas (None para no exportar)
+    REPLICATION_SNAPSHOT_EVERY = 50  # Versiones entre instantáneas completas
+    REPLICATION_KEEP_SNAPSHOTS = 2  # Instantáneas completas conservadas
+    REPLICA_POLL_INTERVAL = 2.0  # Segundos entre comprobaciones de la réplica
+    REPLICA_HTTP_TIMEOUT = 30  # Timeout al descargar del primario por HTTP
+    
+    # Resúmenes precalculados de los PDFs (se generan en segundo plano tras la ingesta)
+    SUMMARIES_ENABLED = False
+    SUMMARY_DIR = "summaries"
+    SUMMARY_SECTION_PAGES = 10  # Páginas por sección resumida
+    SUMMARY_SECTION_CHARS = 6000  # Texto máximo de una sección que se envía al LLM
+    SUMMARY_MAX_TOKENS = 300  # Tokens de cada resumen
+    SUMMARY_MAX_SOURCES = 3  # Con más fuentes, las preguntas de resumen usan la búsqueda normal
+    SUMMARY_NICE = 10  # Prioridad (nice) del hilo de resúmenes
+    
+    # Perfil de ajuste para esta máquina generado por main.py --autotune
+    TUNING_PROFILE_PATH = "tuning_profile.json"
+    
+    def __init__(self):
+        self.tuning_profile = None
+        self.load_tuning_profile(self.TUNING_PROFILE_PATH)
+        
+    def load_tuning_profile(self, path):
+        """
+        Aplica los parámetros de un perfil de autotune si el archivo existe
+        
+        Returns:
+            El perfil cargado o None
+        """
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                profile = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"No se pudo leer el perfil de ajuste {path}: {str(e)}")
+            return None
+            
+        for name, value in profile.get("settings", {}).items():
+            if name in TUNABLE_SETTINGS:
+                setattr(self, name, value)
+        if profile.get("model_path") not in (None, self.MODEL_PATH):
+            print(f"Aviso: el perfil de ajuste {path} se generó con otro modelo ({profile['model_path']})")
+        self.tuning_profile = profile
+        return profile
\ No newline at end of file
@@ -0,0 +1,123 @@
+# document_store.py
+"""
+Archivos de los documentos de la base de datos vectorial
+
+    embeddings.npy       matriz float32 (documentos x dimensión)
+    documents.jsonl      un JSON por línea con el id, el texto y los metadatos
+    documents.idx.npy    desplazamiento en bytes de cada línea (más el final)
+
+Los workers de solo lectura abren los tres archivos con memory-mapping
+(MappedDocuments): las páginas las comparte el sistema operativo entre todos
+los procesos, también después de recargar una versión nueva, y cada documento
+se decodifica solo cuando se accede a él. El escritor los carga en memoria
+como una lista de diccionarios.
+
+Ninguno de los archivos usa pickle, así que también se pueden cargar desde
+fuentes no confiables (instantáneas descargadas por las réplicas).
+"""
+import os
+import json
+import mmap
+import numpy as np
+
+DOCUMENT_FILES = ("embeddings.npy", "documents.jsonl", "documents.idx.npy")
+
+
+def has_documents(directory):
+    return all(os.path.exists(os.path.join(directory, name)) for name in DOCUMENT_FILES)
+
+
+def embeddings_matrix(documents, dimension):
+    """Matriz float32 con el embedding de cada documento"""
+    if len(documents) == 0:
+        return np.zeros((0, dimension), dtype='float32')
+    return np.array([document["embedding"] for document in documents]).astype('float32').reshape(-1, dimension)
+
+
+def encode_documents(documents):
+    """Líneas JSON (bytes) con el id, el texto y los metadatos de cada documento"""
+    return [
+        json.dumps(
+            {"id": document["id"], "text": document["text"], "metadata": document["metadata"]},
+            ensure_ascii=False
+        ).encode("utf-8") + b"\n"
+        for document in documents
+    ]
+
+
+def write_documents(directory, documents, dimension):
+    """
+    Escribe los documentos en directory (cada archivo se reemplaza de forma atómica)
+
+    Args:
+        directory: Directorio de destino
+        documents: Lista de documentos (id, text, metadata, embedding)
+        dimension: Dimensión de los embeddings
+    """
+    embeddings_path, lines_path, offsets_path = (os.path.join(directory, name) for name in DOCUMENT_FILES)
+
+    with open(embeddings_path + ".tmp", 'wb') as f:
+        np.save(f, embeddings_matrix(documents, dimension), allow_pickle=False)
+
+    offsets = [0]
+    with open(lines_path + ".tmp", 'wb') as f:
+        for line in encode_documents(documents):
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+    with open(offsets_path + ".tmp", 'wb') as f:
+        np.save(f, np.array(offsets, dtype='int64'), allow_pickle=False)
+
+    for path in (embeddings_path, lines_path, offsets_path):
+        os.replace(path + ".tmp", path)
+
+
+def load_documents(directory):
+    """Carga los documentos en memoria como lista de diccionarios"""
+    embeddings_path, lines_path, _ = (os.path.join(directory, name) for name in DOCUMENT_FILES)
+    embeddings = np.load(embeddings_path, allow_pickle=False)
+    documents = []
+    with open(lines_path, 'rb') as f:
+        for i, line in enumerate(f):
+            document = json.loads(line)
+            document["embedding"] = embeddings[i]
+            documents.append(document)
+    if len(documents) != len(embeddings):
+        raise ValueError(f"{lines_path} tiene {len(documents)} documentos y {embeddings_path} {len(embeddings)} embeddings")
+    return documents
+
+
+class MappedDocuments:
+    """
+    Secuencia de solo lectura de documentos abierta con memory-mapping
+
+    Se usa como la lista de documentos (len, índice, iteración); cada acceso
+    devuelve un diccionario nuevo con el embedding como vista de la matriz.
+    """
+    def __init__(self, directory):
+        embeddings_path, lines_path, offsets_path = (os.path.join(directory, name) for name in DOCUMENT_FILES)
+        self._embeddings = np.load(embeddings_path, mmap_mode='r', allow_pickle=False)
+        self._offsets = np.load(offsets_path, mmap_mode='r', allow_pickle=False)
+        if len(self._offsets) != len(self._embeddings) + 1:
+            raise ValueError(f"{offsets_path} no corresponde a {embeddings_path}")
+        self._lines = None
+        if len(self._embeddings) > 0:
+            # El mapeo sigue siendo válido aunque el escritor reemplace el archivo
+            with open(lines_path, 'rb') as f:
+                self._lines = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self._embeddings)
+
+    def __getitem__(self, position):
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        start, end = int(self._offsets[position]), int(self._offsets[position + 1])
+        document = json.loads(self._lines[start:end])
+        document["embedding"] = self._embeddings[position]
+        return document
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self[position]
@@ -0,0 +1,350 @@
+# metrics.py
+"""
+Métricas del servicio en formato de texto de Prometheus
+
+Implementación mínima (contadores, gauges e histogramas con etiquetas) sin
+dependencias externas. Cada observación es una búsqueda binaria sobre los
+límites del histograma y unas sumas bajo un lock, así que el coste en el
+camino crítico es de microsegundos.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from . import profiling
+
+# Límites de los histogramas de latencia (segundos)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if value != value:
+        return "NaN"
+    return repr(float(value))
+
+
+class _Metric:
+    metric_type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *labelvalues, **labelkwargs):
+        """Devuelve la serie para los valores de etiqueta indicados (la crea si no existe)"""
+        if labelkwargs:
+            labelvalues = tuple(labelkwargs[name] for name in self.labelnames)
+        key = tuple(str(v) for v in labelvalues)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        return self.labels()
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}"
+        ]
+        for labelvalues, child in sorted(self._children.items()):
+            lines.extend(self._render_child(labelvalues, child))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def _render_child(self, labelvalues, child):
+        return [f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(child.value)}"]
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        """El valor se calcula al exponer las métricas (por ejemplo, el tamaño del índice)"""
+        self.function = function
+
+    def get(self):
+        if self.function is not None:
+            try:
+                value = self.function()
+            except Exception:
+                return float("nan")
+        else:
+            value = self.value
+        # Valor desconocido (por ejemplo, el retraso de una réplica que aún no ha sincronizado)
+        return float("nan") if value is None else value
+
+
+class Gauge(_Metric):
+    metric_type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default().set(value)
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def dec(self, amount=1):
+        self._default().dec(amount)
+
+    def set_function(self, function):
+        self._default().set_function(function)
+
+    def _render_child(self, labelvalues, child):
+        return [f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(child.get())}"]
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[position] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def _render_child(self, labelvalues, child):
+        with child._lock:
+            counts = list(child.counts)
+            total_sum = child.sum
+
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, labelvalues, ("le", _format_value(bound)))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, labelvalues)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total_sum)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def render(self, exclude=()):
+        """Todas las métricas (menos las de exclude) en formato de texto de Prometheus (versión 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            if metric not in exclude:
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Etapas de una petición RAG
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds",
+    "Duración de cada etapa del procesamiento de una petición",
+    ["stage"]
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "rag_http_request_duration_seconds",
+    "Duración total de las peticiones HTTP por endpoint",
+    ["endpoint", "status"]
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "rag_http_requests_in_flight",
+    "Peticiones HTTP en curso"
+)
+
+# Modelo LLM
+LLM_QUEUE_DEPTH = Gauge(
+    "rag_llm_queue_depth",
+    "Peticiones esperando a que el LLM quede libre"
+)
+LLM_TOKENS = Counter(
+    "rag_llm_tokens_total",
+    "Tokens procesados por el LLM",
+    ["kind", "origin"]
+)
+LLM_TOKENS_PER_SECOND = Gauge(
+    "rag_llm_tokens_per_second",
+    "Tokens por segundo de la última generación",
+    ["phase", "origin"]
+)
+
+# Índice vectorial
+INDEX_DOCUMENTS = Gauge(
+    "rag_index_documents",
+    "Documentos (fragmentos) en la base de datos vectorial"
+)
+INDEX_SOURCES = Gauge(
+    "rag_index_sources",
+    "Fuentes distintas en la base de datos vectorial"
+)
+
+# Replicación
+REPLICATION_LAG_SECONDS = Gauge(
+    "rag_replication_lag_seconds",
+    "Segundos desde la última vez que la réplica estaba al día con el primario"
+)
+REPLICATION_VERSIONS_BEHIND = Gauge(
+    "rag_replication_versions_behind",
+    "Versiones del primario pendientes de aplicar en la réplica"
+)
+
+# Cachés de recuperación
+CACHE_REQUESTS = Counter(
+    "rag_cache_requests_total",
+    "Consultas a las cachés de recuperación por resultado (hit o miss)",
+    ["cache", "result"]
+)
+CACHE_ENTRIES = Gauge(
+    "rag_cache_entries",
+    "Entradas en cada caché de recuperación",
+    ["cache"]
+)
+
+# Ingesta
+INGESTION_STAGE_SECONDS = Histogram(
+    "rag_ingestion_stage_duration_seconds",
+    "Duración de cada etapa de la ingesta de un PDF",
+    ["stage"]
+)
+INGESTED_PAGES = Counter(
+    "rag_ingested_pages_total",
+    "Páginas de PDF procesadas"
+)
+INGESTED_CHUNKS = Counter(
+    "rag_ingested_chunks_total",
+    "Fragmentos añadidos a la base de datos"
+)
+INGESTION_THROUGHPUT = Gauge(
+    "rag_ingestion_throughput",
+    "Rendimiento de la última ingesta (unidades por segundo)",
+    ["unit"]
+)
+
+# Con --workers estas métricas las registra el proceso escritor, que las
+# publica en la cola de ingesta para que los workers las expongan
+WRITER_METRICS = (INGESTION_STAGE_SECONDS, INGESTED_PAGES, INGESTED_CHUNKS, INGESTION_THROUGHPUT)
+
+
+def observe_stage(name, seconds, ended_at=None):
+    """
+    Registra la duración de una etapa medida fuera de stage()
+    
+    ended_at (time.perf_counter) solo hace falta si la etapa terminó antes de
+    registrarla; se usa para situarla en la traza de la petición.
+    """
+    STAGE_SECONDS.labels(name).observe(seconds)
+    if profiling.tracing_enabled:
+        profiling.record_stage(name, seconds, ended_at)
+
+
+@contextmanager
+def stage(name):
+    """Context manager que mide una etapa: `with stage("faiss_search"): ...`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+def render(writer_metrics=None):
+    """
+    Métricas de este proceso. writer_metrics es el texto publicado por el
+    proceso escritor (render_writer) y sustituye a las WRITER_METRICS locales.
+    """
+    if writer_metrics is None:
+        return REGISTRY.render()
+    return REGISTRY.render(exclude=WRITER_METRICS) + writer_metrics
+
+
+def render_writer():
+    """WRITER_METRICS en formato de texto de Prometheus"""
+    lines = []
+    for metric in WRITER_METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -1,53 +1,135 @@
 # model_manager.py
 """
 Clase para gestionar el modelo de lenguaje
+
+Las librerías pesadas (llama_cpp, sentence_transformers/torch) se importan
+al cargar cada modelo para que el arranque del servicio no espere por ellas.
 """
-from llama_cpp import Llama
-from sentence_transformers import SentenceTransformer
+import threading
+import time
 import numpy as np
+from .metrics import observe_stage, LLM_QUEUE_DEPTH, LLM_TOKENS, LLM_TOKENS_PER_SECOND
 
 class ModelManager:
     def __init__(self, config):
         self.config = config
         self.llm = None
         self.embedding_model = None
+        # llama.cpp no admite llamadas concurrentes sobre el mismo contexto
+        self._llm_lock = threading.Lock()
+        # Cada modelo se carga una sola vez aunque lo pidan varios hilos a la vez
+        # (carga en segundo plano, peticiones, hilo de resúmenes)
+        self._llm_load_lock = threading.Lock()
+        self._embedding_load_lock = threading.Lock()
         
     def load_model(self):
-        """Carga el modelo LLM usando llama-cpp-python"""
+        """
+        Carga el modelo LLM si todavía no está cargado y lo devuelve.
+        Si otro hilo lo está cargando, espera a que termine en lugar de cargar una segunda copia.
+        """
+        with self._llm_load_lock:
+            if self.llm is None:
+                self.llm = self._create_llm()
+        return self.llm
+        
+    def _create_llm(self):
+        """Crea el modelo LLM usando llama-cpp-python"""
+        from llama_cpp import Llama
+
         print(f"Cargando modelo desde {self.config.MODEL_PATH}...")
-        self.llm = Llama(
+        llm = Llama(
             model_path=self.config.MODEL_PATH,
             n_ctx=self.config.N_CTX,
-            n_threads=self.config.N_THREADS
+            n_threads=self.config.N_THREADS,
+            n_threads_batch=self.config.N_THREADS_BATCH or self.config.N_THREADS,
+            n_batch=self.config.N_BATCH,
+            use_mmap=self.config.USE_MMAP,
+            use_mlock=self.config.USE_MLOCK
         )
         print("Modelo LLM cargado exitosamente")
-        return self.llm
+        return llm
     
     def load_embedding_model(self):
-        """Carga el modelo de embeddings usando sentence-transformers"""
+        """Carga el modelo de embeddings si todavía no está cargado y lo devuelve (una sola vez, como load_model)"""
+        with self._embedding_load_lock:
+            if self.embedding_model is None:
+                self.embedding_model = self._create_embedding_model()
+        return self.embedding_model
+        
+    def _create_embedding_model(self):
+        """Crea el modelo de embeddings usando sentence-transformers"""
+        from sentence_transformers import SentenceTransformer
+
+        if self.config.TORCH_THREADS:
+            import torch
+            torch.set_num_threads(self.config.TORCH_THREADS)
+            
         print(f"Cargando modelo de embeddings {self.config.EMBEDDING_MODEL_PATH}...")
-        self.embedding_model = SentenceTransformer(self.config.EMBEDDING_MODEL_PATH)
+        embedding_model = SentenceTransformer(self.config.EMBEDDING_MODEL_PATH)
         print("Modelo de embeddings cargado exitosamente")
-        return self.embedding_model
+        return embedding_model
+        
+    def is_busy(self):
+        """True si el LLM está generando o hay peticiones esperando por él"""
+        return self._llm_lock.locked()
         
-    def generate_response(self, prompt, max_tokens=150, temperature=0.7):
-        """Genera una respuesta usando el modelo LLM"""
+    def generate_response(self, prompt, max_tokens=150, temperature=0.7, origin="request"):
+        """
+        Genera una respuesta usando el modelo LLM
+        
+        origin separa en las métricas las generaciones de las peticiones de los
+        usuarios ("request") de las de segundo plano (por ejemplo, "summary")
+        """
         if self.llm is None:
             self.load_model()
             
         # Formateamos el prompt según el formato del modelo
         formatted_prompt = f"[INST] {prompt} [/INST]"
         
-        # Generamos la respuesta
-        response = self.llm(
-            formatted_prompt, 
-            max_tokens=max_tokens,
-            temperature=temperature
-        )
+        LLM_QUEUE_DEPTH.inc()
+        with self._llm_lock:
+            LLM_QUEUE_DEPTH.dec()
+            prompt_tokens = len(self.llm.tokenize(formatted_prompt.encode("utf-8")))
+            
+            # Generamos la respuesta en modo streaming para separar el tiempo de
+            # prefill (hasta el primer token) del de decodificación
+            start = time.perf_counter()
+            first_token_at = None
+            pieces = []
+            for chunk in self.llm(
+                formatted_prompt, 
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True
+            ):
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                pieces.append(chunk["choices"][0]["text"])
+            end = time.perf_counter()
+            
+        self._record_generation(prompt_tokens, len(pieces), start, first_token_at or end, end, origin)
         
         # Extraemos el texto generado de la respuesta
-        generated_text = response["choices"][0]["text"].strip()
+        generated_text = "".join(pieces).strip()
         return generated_text
+        
+    def _record_generation(self, prompt_tokens, completion_tokens, start, first_token_at, end, origin):
+        """Registra tiempos y tokens de una generación en las métricas"""
+        prefill_seconds = first_token_at - start
+        decode_seconds = end - first_token_at
+        # Las etapas son parte de la latencia de una petición: las generaciones
+        # en segundo plano no cuentan
+        if origin == "request":
+            observe_stage("llm_prefill", prefill_seconds, ended_at=first_token_at)
+            observe_stage("llm_decode", decode_seconds, ended_at=end)
+        
+        LLM_TOKENS.labels("prompt", origin).inc(prompt_tokens)
+        LLM_TOKENS.labels("completion", origin).inc(completion_tokens)
+        if prefill_seconds > 0:
+            LLM_TOKENS_PER_SECOND.labels("prefill", origin).set(prompt_tokens / prefill_seconds)
+        # El primer token sale del prefill; el resto corresponde a la decodificación
+        if decode_seconds > 0 and completion_tokens > 1:
+            LLM_TOKENS_PER_SECOND.labels("decode", origin).set((completion_tokens - 1) / decode_seconds)
     
     def generate_embeddings(self, text):
         """Genera embeddings para un texto dado usando el modelo de embeddings"""
@@ -58,4 +140,12 @@ class ModelManager:
         embedding = self.embedding_model.encode(text)
         
         # Convertimos a numpy array para compatibilidad con FAISS
-        return np.array(embedding)
\ No newline at end of file
+        return np.array(embedding)
+        
+    def generate_embeddings_batch(self, texts):
+        """Genera los embeddings de varios textos en lotes de EMBEDDING_BATCH_SIZE"""
+        if self.embedding_model is None:
+            self.load_embedding_model()
+            
+        embeddings = self.embedding_model.encode(list(texts), batch_size=self.config.EMBEDDING_BATCH_SIZE)
+        return [np.array(embedding) for embedding in embeddings]
\ No newline at end of file
@@ -3,24 +3,29 @@
 Utilidades para procesar PDFs y cargarlos en la base de datos vectorial
 """
 import os
+import bisect
+import time
 import PyPDF2
 import re
 from tqdm import tqdm
+from .metrics import (
+    INGESTION_STAGE_SECONDS, INGESTED_PAGES, INGESTED_CHUNKS, INGESTION_THROUGHPUT
+)
 
-def extract_text_from_pdf(pdf_path):
+def extract_pages_from_pdf(pdf_path):
     """
-    Extrae el texto completo de un archivo PDF
+    Extrae el texto de cada página de un archivo PDF
     
     Args:
         pdf_path: Ruta al archivo PDF
         
     Returns:
-        Texto extraído del PDF
+        Lista con el texto de cada página (cadena vacía si la página no tiene texto)
     """
     if not os.path.exists(pdf_path):
         raise FileNotFoundError(f"El archivo {pdf_path} no existe")
         
-    text = ""
+    pages = []
     with open(pdf_path, 'rb') as file:
         reader = PyPDF2.PdfReader(file)
         num_pages = len(reader.pages)
@@ -28,11 +33,66 @@ def extract_text_from_pdf(pdf_path):
         print(f"Procesando PDF con {num_pages} páginas...")
         for page_num in tqdm(range(num_pages)):
             page = reader.pages[page_num]
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n\n"
+            pages.append(page.extract_text() or "")
                     
-    return text
+    return pages
+
+def extract_text_from_pdf(pdf_path):
+    """
+    Extrae el texto completo de un archivo PDF
+    
+    Args:
+        pdf_path: Ruta al archivo PDF
+        
+    Returns:
+        Texto extraído del PDF
+    """
+    return _join_pages(extract_pages_from_pdf(pdf_path))
+
+def _join_pages(pages):
+    return "".join(page_text + "\n\n" for page_text in pages if page_text)
+
+def chunk_page_ranges(pages, chunks):
+    """
+    Calcula la primera y la última página (1-based) que cubre cada fragmento
+    
+    Args:
+        pages: Texto de cada página, como lo devuelve extract_pages_from_pdf
+        chunks: Fragmentos generados por chunk_text a partir de esas páginas
+        
+    Returns:
+        Lista de tuplas (página_inicial, página_final), una por fragmento
+    """
+    # chunk_text normaliza los espacios del texto completo, así que se reproduce
+    # esa normalización página a página para saber dónde empieza cada una
+    page_starts = []
+    page_numbers = []
+    position = 0
+    for page_num, page_text in enumerate(pages, start=1):
+        normalized = re.sub(r'\s+', ' ', page_text).strip()
+        if not normalized:
+            continue
+        page_starts.append(position)
+        page_numbers.append(page_num)
+        position += len(normalized) + 1  # Espacio que separa las páginas
+    
+    full_text = re.sub(r'\s+', ' ', _join_pages(pages)).strip()
+    
+    ranges = []
+    search_from = 0
+    for chunk in chunks:
+        start = full_text.find(chunk, search_from)
+        if start == -1 or not page_numbers:
+            ranges.append((None, None))
+            continue
+        end = start + len(chunk) - 1
+        first = page_numbers[bisect.bisect_right(page_starts, start) - 1]
+        last = page_numbers[bisect.bisect_right(page_starts, end) - 1]
+        ranges.append((first, last))
+        # Los fragmentos se solapan: el siguiente empieza después del inicio de este
+        search_from = start + 1
+        
+    return ranges
 
 def chunk_text(text, chunk_size=1000, chunk_overlap=200):
     """
@@ -86,7 +146,8 @@ def chunk_text(text, chunk_size=1000, chunk_overlap=200):
     print(f"Texto dividido en {len(chunks)} fragmentos")
     return chunks
 
-def load_pdf_to_db(pdf_path, model_manager, vector_db, chunk_size=1000, chunk_overlap=200):
+def load_pdf_to_db(pdf_path, model_manager, vector_db, chunk_size=1000, chunk_overlap=200, source_name=None,
+                   summarizer=None):
     """
     Carga un PDF en la base de datos vectorial
     
@@ -96,35 +157,67 @@ def load_pdf_to_db(pdf_path, model_manager, vector_db, chunk_size=1000, chunk_ov
         vector_db: Instancia de VectorDatabase para almacenar documentos
         chunk_size: Tamaño de cada fragmento
         chunk_overlap: Superposición entre fragmentos
+        source_name: Nombre de la fuente en los metadatos (por defecto, el nombre del archivo)
+        summarizer: SummaryWorker opcional que resume el PDF en segundo plano
         
     Returns:
         Número de fragmentos añadidos
     """
+    started = time.perf_counter()
+    
     # Extraer texto del PDF
-    text = extract_text_from_pdf(pdf_path)
+    with INGESTION_STAGE_SECONDS.labels("extract").time():
+        pages = extract_pages_from_pdf(pdf_path)
+        text = _join_pages(pages)
     
     # Dividir en fragmentos
-    chunks = chunk_text(text, chunk_size, chunk_overlap)
+    with INGESTION_STAGE_SECONDS.labels("chunk").time():
+        chunks = chunk_text(text, chunk_size, chunk_overlap)
+        page_ranges = chunk_page_ranges(pages, chunks)
     
     # Obtener metadatos del PDF
-    pdf_filename = os.path.basename(pdf_path)
+    pdf_filename = source_name or os.path.basename(pdf_path)
     
     # Añadir fragmentos a la base de datos
     print(f"Añadiendo {len(chunks)} fragmentos a la base de datos vectorial...")
-    for i, chunk in enumerate(chunks):
+    
+    # Generar los embeddings en lotes (EMBEDDING_BATCH_SIZE)
+    with INGESTION_STAGE_SECONDS.labels("embed").time():
+        embeddings = model_manager.generate_embeddings_batch(chunks) if chunks else []
+    
+    items = []
+    for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
         metadata = {
             "source": pdf_filename,
             "chunk_id": i,
             "total_chunks": len(chunks),
-            "type": "pdf"
+            "type": "pdf",
+            "page_start": page_ranges[i][0],
+            "page_end": page_ranges[i][1],
+            "total_pages": len(pages),
+            "embedding_model": model_manager.config.EMBEDDING_MODEL_PATH
         }
-        
-        # Generar embedding y añadir a la BD
-        embedding = model_manager.generate_embeddings(chunk)
-        vector_db.add_document(chunk, embedding, metadata)
+        items.append((chunk, embedding, metadata))
+    
+    # Añadir todos los fragmentos en una sola versión de la BD: las búsquedas
+    # concurrentes ven el PDF completo o nada
+    with INGESTION_STAGE_SECONDS.labels("index").time():
+        vector_db.add_documents(items)
     
     # Guardar la BD
-    vector_db.save()
+    with INGESTION_STAGE_SECONDS.labels("save").time():
+        vector_db.save()
+    
+    elapsed = time.perf_counter() - started
+    INGESTED_PAGES.inc(len(pages))
+    INGESTED_CHUNKS.inc(len(chunks))
+    if elapsed > 0:
+        INGESTION_THROUGHPUT.labels("pages_per_second").set(len(pages) / elapsed)
+        INGESTION_THROUGHPUT.labels("chunks_per_second").set(len(chunks) / elapsed)
+    
+    # Resúmenes por documento y sección (no bloquea la respuesta de la ingesta)
+    if summarizer is not None and chunks:
+        summarizer.submit(pdf_filename, chunks, page_ranges, len(pages))
     
     print(f"PDF procesado: {len(chunks)} fragmentos añadidos a la base de datos")
     return len(chunks)
\ No newline at end of file
@@ -0,0 +1,118 @@
+# profiling.py
+"""
+Perfilado bajo demanda: trazas por petición y muestreo del proceso
+
+- Trazas por petición: mientras una petición tiene una traza activa, cada etapa
+  medida con metrics.stage/observe_stage se anota con su inicio y duración.
+  Si el perfilado está desactivado (por defecto) no se registra ningún hook y
+  la única comprobación en el camino crítico es leer un booleano.
+- Muestreo: SamplingProfiler recorre periódicamente las pilas de todos los hilos
+  (sys._current_frames) y devuelve las pilas agregadas en formato "folded",
+  compatible con flamegraph.pl, speedscope o inferno.
+"""
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Se activa desde FlaskService solo si PROFILING_ENABLED está en la configuración
+tracing_enabled = False
+
+_current_trace = contextvars.ContextVar("profiling_trace", default=None)
+
+
+def enable_tracing():
+    global tracing_enabled
+    tracing_enabled = True
+
+
+class RequestTrace:
+    """Etapas registradas durante una petición"""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = []
+
+    def add(self, name, seconds, ended_at=None):
+        end = (ended_at if ended_at is not None else time.perf_counter()) - self.started
+        self.stages.append({
+            "stage": name,
+            "start_ms": round((end - seconds) * 1000.0, 3),
+            "duration_ms": round(seconds * 1000.0, 3)
+        })
+
+    def total_ms(self):
+        return round((time.perf_counter() - self.started) * 1000.0, 3)
+
+    def server_timing(self):
+        """Valor de la cabecera Server-Timing (visible en las herramientas del navegador)"""
+        parts = [f"{s['stage']};dur={s['duration_ms']}" for s in self.stages]
+        parts.append(f"total;dur={self.total_ms()}")
+        return ", ".join(parts)
+
+
+def start_trace():
+    trace = RequestTrace()
+    _current_trace.set(trace)
+    return trace
+
+
+def finish_trace():
+    trace = _current_trace.get()
+    _current_trace.set(None)
+    return trace
+
+
+def record_stage(name, seconds, ended_at=None):
+    """Anota una etapa en la traza de la petición actual, si la hay"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, seconds, ended_at)
+
+
+class SamplingProfiler:
+    """
+    Perfilador por muestreo de todos los hilos del proceso
+
+    Args:
+        interval: Segundos entre muestras
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+
+    @staticmethod
+    def _frame_label(frame):
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def capture(self, seconds):
+        """
+        Toma muestras durante `seconds` segundos
+
+        Returns:
+            (texto en formato folded, número de muestras)
+        """
+        own_thread = threading.get_ident()
+        thread_names = {}
+        stacks = Counter()
+        samples = 0
+        deadline = time.perf_counter() + seconds
+
+        while time.perf_counter() < deadline:
+            for thread in threading.enumerate():
+                thread_names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(self._frame_label(frame))
+                    frame = frame.f_back
+                labels.append(thread_names.get(thread_id, f"thread-{thread_id}"))
+                stacks[";".join(reversed(labels))] += 1
+            samples += 1
+            time.sleep(self.interval)
+
+        folded = "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+        return folded + "\n", samples
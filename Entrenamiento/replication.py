@@ -0,0 +1,426 @@
+# replication.py
+"""
+Replicación de la base de datos vectorial hacia réplicas de solo lectura
+
+El primario exporta, en REPLICATION_DIR, cada versión que guarda:
+
+    head.json                   versión actual y última instantánea completa
+    deltas/000000000042.json    cambios (add/remove/clear) de la v41 a la v42
+    deltas/000000000042.npy     embeddings de los documentos añadidos en esos cambios
+    snapshots/v40/              documentos (ver document_store), catalog.json, manifest.json
+
+Cada REPLICATION_SNAPSHOT_EVERY versiones (o si falta algún delta) se exporta
+una instantánea completa; los deltas anteriores a la instantánea más antigua
+conservada se borran. head.json se escribe siempre en último lugar, así que
+todo lo que anuncia ya existe.
+
+Una réplica (main.py --serve --replica-of <directorio o URL>) carga la última
+instantánea y después aplica los deltas en orden, sin recargar todo el índice.
+El transporte puede ser el propio directorio (compartido o montado por red) o
+los endpoints /api/replication/* de un primario en marcha.
+
+Nada de lo exportado usa pickle: los textos y metadatos van en JSON y los
+embeddings en .npy, que la réplica lee con allow_pickle=False. Las réplicas
+reconstruyen el índice FAISS a partir de los embeddings.
+"""
+import io
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+import numpy as np
+from .document_store import DOCUMENT_FILES, write_documents, embeddings_matrix
+
+SNAPSHOT_FILES = DOCUMENT_FILES + ("catalog.json", "manifest.json")
+DELTA_EXTENSIONS = ("json", "npy")
+
+
+def delta_filename(version, extension="json"):
+    return f"{version:012d}.{extension}"
+
+
+def encode_changes(changes, dimension):
+    """
+    Convierte los cambios de un delta a JSON y a una matriz con los embeddings
+    de los documentos añadidos, en el mismo orden en que aparecen
+    """
+    encoded = []
+    added = []
+    for change in changes:
+        if change[0] == "add":
+            encoded.append({
+                "op": "add",
+                "documents": [
+                    {"id": document["id"], "text": document["text"], "metadata": document["metadata"]}
+                    for document in change[1]
+                ]
+            })
+            added.extend(change[1])
+        elif change[0] == "remove":
+            encoded.append({"op": "remove", "source": change[1]})
+        elif change[0] == "clear":
+            encoded.append({"op": "clear"})
+        else:
+            raise ValueError(f"Cambio desconocido: {change[0]}")
+    return encoded, embeddings_matrix(added, dimension)
+
+
+def decode_changes(encoded, embeddings):
+    """Operación inversa de encode_changes: lista de cambios para VectorDatabase.apply_changes"""
+    changes = []
+    position = 0
+    for change in encoded:
+        if change["op"] == "add":
+            documents = change["documents"]
+            for document in documents:
+                document["embedding"] = embeddings[position]
+                position += 1
+            changes.append(("add", documents))
+        elif change["op"] == "remove":
+            changes.append(("remove", change["source"]))
+        elif change["op"] == "clear":
+            changes.append(("clear",))
+        else:
+            raise ValueError(f"Cambio desconocido: {change['op']}")
+    if position != len(embeddings):
+        raise ValueError(f"El delta tiene {len(embeddings)} embeddings para {position} documentos")
+    return changes
+
+
+def _npy_bytes(array):
+    buffer = io.BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def _load_delta(data, embeddings_data):
+    """Delta a partir del contenido de sus archivos .json y .npy"""
+    delta = json.loads(data)
+    embeddings = np.load(io.BytesIO(embeddings_data), allow_pickle=False)
+    delta["changes"] = decode_changes(delta["changes"], embeddings)
+    return delta
+
+
+def _write_atomic(path, data, mode='wb'):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, mode) as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class ReplicationLog:
+    """
+    Exportación de versiones en el primario
+
+    Args:
+        root: Directorio de exportación
+        snapshot_every: Versiones entre instantáneas completas
+        keep_snapshots: Instantáneas completas que se conservan
+    """
+    def __init__(self, root, snapshot_every=50, keep_snapshots=2):
+        self.root = root
+        self.snapshot_every = snapshot_every
+        self.keep_snapshots = keep_snapshots
+        self.deltas_dir = os.path.join(root, "deltas")
+        self.snapshots_dir = os.path.join(root, "snapshots")
+        os.makedirs(self.deltas_dir, exist_ok=True)
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+
+    def head(self):
+        try:
+            with open(os.path.join(self.root, "head.json"), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def ensure_snapshot(self, version, snapshot):
+        """
+        Exporta una instantánea si lo exportado no corresponde a la versión cargada
+        (o si la última instantánea falta o es de un formato anterior)
+        """
+        head = self.head()
+        if head is None or head["version"] != version or not self._has_snapshot(head["snapshot_version"]):
+            self._write_snapshot(version, snapshot)
+            self._write_head(version, version)
+
+    def publish(self, version, changes, snapshot):
+        """
+        Exporta una versión recién guardada
+
+        Args:
+            version: Versión publicada
+            changes: Cambios desde la versión anterior [("add", documentos), ("remove", fuente), ("clear",)]
+            snapshot: Instantánea guardada (se exporta entera si toca)
+        """
+        head = self.head()
+        contiguous = head is not None and head["version"] == version - 1
+        if contiguous:
+            encoded, embeddings = encode_changes(changes, snapshot.index.d)
+            delta = {
+                "version": version,
+                "base_version": version - 1,
+                "created_at": time.time(),
+                "changes": encoded
+            }
+            # El .json se escribe después: si existe, su .npy también
+            _write_atomic(os.path.join(self.deltas_dir, delta_filename(version, "npy")), _npy_bytes(embeddings))
+            _write_atomic(
+                os.path.join(self.deltas_dir, delta_filename(version, "json")),
+                json.dumps(delta, ensure_ascii=False).encode("utf-8")
+            )
+
+        snapshot_version = head["snapshot_version"] if head is not None else None
+        if not contiguous or version - snapshot_version >= self.snapshot_every:
+            self._write_snapshot(version, snapshot)
+            snapshot_version = version
+
+        self._write_head(version, snapshot_version)
+        self._prune()
+
+    def _write_snapshot(self, version, snapshot):
+        final_dir = os.path.join(self.snapshots_dir, f"v{version}")
+        tmp_dir = f"{final_dir}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        dimension = snapshot.index.d
+        write_documents(tmp_dir, snapshot.documents, dimension)
+        with open(os.path.join(tmp_dir, "catalog.json"), 'w', encoding='utf-8') as f:
+            json.dump(snapshot.sources, f)
+        with open(os.path.join(tmp_dir, "manifest.json"), 'w', encoding='utf-8') as f:
+            json.dump({
+                "version": version,
+                "documents": len(snapshot.documents),
+                "dimension": dimension,
+                "created_at": time.time()
+            }, f)
+
+        shutil.rmtree(final_dir, ignore_errors=True)
+        os.replace(tmp_dir, final_dir)
+        print(f"Instantánea v{version} exportada para réplicas")
+
+    def _write_head(self, version, snapshot_version):
+        data = {"version": version, "snapshot_version": snapshot_version, "updated_at": time.time()}
+        _write_atomic(os.path.join(self.root, "head.json"), json.dumps(data), mode='w')
+
+    def _has_snapshot(self, version):
+        directory = os.path.join(self.snapshots_dir, f"v{version}")
+        return all(os.path.exists(os.path.join(directory, name)) for name in SNAPSHOT_FILES)
+
+    def _snapshot_versions(self):
+        versions = []
+        for name in os.listdir(self.snapshots_dir):
+            if name.startswith("v") and name[1:].isdigit():
+                versions.append(int(name[1:]))
+        return sorted(versions)
+
+    def _prune(self):
+        """Borra las instantáneas antiguas y los deltas que ya no hacen falta"""
+        versions = self._snapshot_versions()
+        for version in versions[:-self.keep_snapshots]:
+            shutil.rmtree(os.path.join(self.snapshots_dir, f"v{version}"), ignore_errors=True)
+        oldest = versions[-self.keep_snapshots:][0]
+        for name in os.listdir(self.deltas_dir):
+            version, _, extension = name.partition(".")
+            # .pkl: deltas del formato anterior
+            if extension in DELTA_EXTENSIONS + ("pkl",) and version.isdigit() and int(version) <= oldest:
+                os.remove(os.path.join(self.deltas_dir, name))
+
+
+class DirectorySource:
+    """Lee lo exportado por el primario directamente de su directorio"""
+    def __init__(self, root):
+        self.root = root
+
+    def head(self):
+        try:
+            with open(os.path.join(self.root, "head.json"), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def fetch_snapshot(self, version):
+        """Directorio con los archivos de la instantánea"""
+        return os.path.join(self.root, "snapshots", f"v{version}")
+
+    def release_snapshot(self, directory):
+        pass
+
+    def fetch_delta(self, version):
+        """Delta de la versión indicada, o None si ya no está disponible"""
+        try:
+            with open(os.path.join(self.root, "deltas", delta_filename(version, "json")), 'rb') as f:
+                data = f.read()
+            with open(os.path.join(self.root, "deltas", delta_filename(version, "npy")), 'rb') as f:
+                embeddings_data = f.read()
+        except FileNotFoundError:
+            return None
+        return _load_delta(data, embeddings_data)
+
+
+class HttpSource:
+    """Descarga lo exportado por el primario desde sus endpoints /api/replication/*"""
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip("/") + "/api/replication"
+        self.timeout = timeout
+
+    def _get(self, path):
+        try:
+            with urllib.request.urlopen(f"{self.base_url}/{path}", timeout=self.timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+
+    def head(self):
+        data = self._get("head")
+        return json.loads(data) if data is not None else None
+
+    def fetch_snapshot(self, version):
+        directory = tempfile.mkdtemp(prefix=f"replica_v{version}_")
+        for name in SNAPSHOT_FILES:
+            data = self._get(f"snapshot/{version}/{name}")
+            if data is None:
+                shutil.rmtree(directory, ignore_errors=True)
+                raise FileNotFoundError(f"La instantánea v{version} ya no está disponible en el primario")
+            with open(os.path.join(directory, name), 'wb') as f:
+                f.write(data)
+        return directory
+
+    def release_snapshot(self, directory):
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def fetch_delta(self, version):
+        data = self._get(f"delta/{version}.json")
+        if data is None:
+            return None
+        embeddings_data = self._get(f"delta/{version}.npy")
+        if embeddings_data is None:
+            return None
+        return _load_delta(data, embeddings_data)
+
+
+class Replica:
+    """
+    Mantiene una VectorDatabase de solo lectura sincronizada con un primario
+
+    Args:
+        source: Directorio de exportación del primario o URL del primario
+        vector_db: VectorDatabase en modo solo lectura que se mantiene al día
+        poll_interval: Segundos entre comprobaciones de nuevas versiones
+        timeout: Timeout de las peticiones HTTP (solo con URL)
+    """
+    def __init__(self, source, vector_db, poll_interval=2.0, timeout=30):
+        if source.startswith("http://") or source.startswith("https://"):
+            self.source = HttpSource(source, timeout=timeout)
+        else:
+            self.source = DirectorySource(source)
+        self.source_name = source
+        self.vector_db = vector_db
+        self.poll_interval = poll_interval
+        self.primary_version = None
+        self.primary_updated_at = None
+        self.caught_up_at = None
+        self.last_poll_at = None
+        self.last_error = None
+        self.bootstraps = 0
+        self.deltas_applied = 0
+        self._lock = threading.Lock()
+
+    @property
+    def applied_version(self):
+        return self.vector_db.version
+
+    def bootstrap(self):
+        """Carga la última instantánea completa del primario y aplica los deltas pendientes"""
+        with self._lock:
+            self._bootstrap(self.source.head())
+            self._catch_up()
+
+    def _bootstrap(self, head):
+        if head is None:
+            raise RuntimeError(f"El primario todavía no ha exportado ninguna versión en {self.source_name}")
+        version = head["snapshot_version"]
+        directory = self.source.fetch_snapshot(version)
+        try:
+            self.vector_db.load_snapshot(directory, version)
+        finally:
+            self.source.release_snapshot(directory)
+        self.bootstraps += 1
+
+    def sync(self):
+        """Aplica las versiones nuevas del primario"""
+        with self._lock:
+            self._catch_up()
+
+    def _catch_up(self):
+        head = self.source.head()
+        self.last_poll_at = time.time()
+        if head is None:
+            return
+        self.primary_version = head["version"]
+        self.primary_updated_at = head["updated_at"]
+
+        # El primario se reinició desde cero: empezar de nuevo
+        if head["version"] < self.applied_version:
+            self._bootstrap(head)
+
+        while self.applied_version < head["version"]:
+            delta = self.source.fetch_delta(self.applied_version + 1)
+            if delta is None:
+                if head["snapshot_version"] <= self.applied_version:
+                    raise RuntimeError(f"El primario no tiene el delta v{self.applied_version + 1}")
+                # El delta ya se purgó (réplica muy atrasada): volver a la instantánea
+                print(f"Delta v{self.applied_version + 1} no disponible, recargando la instantánea")
+                self._bootstrap(head)
+                continue
+            self.vector_db.apply_changes(delta["version"], delta["changes"])
+            self.deltas_applied += 1
+
+        self.caught_up_at = time.time()
+        self.last_error = None
+
+    def start(self):
+        """Sigue al primario en un hilo en segundo plano"""
+        thread = threading.Thread(target=self._follow, name="replica-sync", daemon=True)
+        thread.start()
+        return thread
+
+    def _follow(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.sync()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Error al sincronizar con el primario: {str(e)}")
+
+    def versions_behind(self):
+        if self.primary_version is None:
+            return None
+        return max(0, self.primary_version - self.applied_version)
+
+    def lag_seconds(self):
+        """Segundos desde la última vez que la réplica estaba al día con el primario"""
+        if self.caught_up_at is None:
+            return None
+        return time.time() - self.caught_up_at
+
+    def status(self):
+        lag = self.lag_seconds()
+        return {
+            "primary": self.source_name,
+            "applied_version": self.applied_version,
+            "primary_version": self.primary_version,
+            "versions_behind": self.versions_behind(),
+            "lag_seconds": round(lag, 3) if lag is not None else None,
+            "last_poll_at": self.last_poll_at,
+            "bootstraps": self.bootstraps,
+            "deltas_applied": self.deltas_applied,
+            "last_error": self.last_error
+        }
@@ -0,0 +1,116 @@
+# retrieval_cache.py
+"""
+Cachés LRU para consultas repetidas (autocompletado y reintentos de la interfaz)
+
+- Embeddings: texto de la consulta -> embedding. No depende de la base de datos.
+- Resultados: (embedding, top_k, filtro, versión de la BD) -> posiciones y
+  distancias de los documentos. La versión es la generación de la instantánea
+  de VectorDatabase, que cambia con cada alta, borrado, limpieza o recarga, así
+  que una entrada nunca devuelve resultados de otra versión. Al detectar una
+  versión nueva se vacía la caché para liberar la memoria de la anterior.
+"""
+import threading
+from collections import OrderedDict
+from .metrics import CACHE_REQUESTS, CACHE_ENTRIES
+
+
+class LRUCache:
+    """
+    Caché LRU acotada y segura entre hilos
+
+    Args:
+        name: Nombre de la caché en las métricas
+        max_entries: Número máximo de entradas (0 la desactiva)
+    """
+    def __init__(self, name, max_entries):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._hit_counter = CACHE_REQUESTS.labels(name, "hit")
+        self._miss_counter = CACHE_REQUESTS.labels(name, "miss")
+        CACHE_ENTRIES.labels(name).set_function(lambda: len(self._entries))
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        (self._miss_counter if value is None else self._hit_counter).inc()
+        return value
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None
+        }
+
+
+class RetrievalCache:
+    """Cachés de embeddings de consultas y de resultados de búsqueda"""
+    def __init__(self, embedding_entries, result_entries):
+        self.embeddings = LRUCache("query_embedding", embedding_entries)
+        self.results = LRUCache("search_results", result_entries)
+        self._generation = None
+        self._generation_lock = threading.Lock()
+
+    def embedding(self, query, compute):
+        """Embedding de la consulta, calculado con compute(query) si no está en caché"""
+        embedding = self.embeddings.get(query)
+        if embedding is None:
+            embedding = compute(query)
+            # Se comparte entre peticiones: que nadie lo modifique por accidente
+            embedding.setflags(write=False)
+            self.embeddings.put(query, embedding)
+        return embedding
+
+    def _check_generation(self, generation):
+        """
+        True si la generación es la actual. Una generación nueva vacía la caché;
+        una anterior (un lector que aún usa la instantánea previa) no se cachea
+        para no borrar las entradas de la actual.
+        """
+        if self._generation is None or generation > self._generation:
+            with self._generation_lock:
+                if self._generation is None or generation > self._generation:
+                    self.results.clear()
+                    self._generation = generation
+        return generation == self._generation
+
+    def get_results(self, query_embedding, top_k, source_filter, generation):
+        if not self._check_generation(generation):
+            return None
+        return self.results.get((query_embedding.tobytes(), top_k, source_filter, generation))
+
+    def put_results(self, query_embedding, top_k, source_filter, generation, hits):
+        if not self._check_generation(generation):
+            return
+        self.results.put((query_embedding.tobytes(), top_k, source_filter, generation), hits)
+
+    def stats(self):
+        return {
+            "query_embedding": self.embeddings.stats(),
+            "search_results": self.results.stats()
+        }
@@ -0,0 +1,406 @@
+# serving.py
+"""
+Servicio de producción con varios procesos (pre-fork) y un único proceso escritor
+
+Los workers abren la base de datos vectorial en modo solo lectura: el índice y
+los documentos se abren con memory-mapping, así que el sistema operativo
+comparte sus páginas entre procesos. Las escrituras se encolan en disco y las
+aplica un único proceso escritor, que publica una nueva versión; los workers la
+detectan en la siguiente petición y recargan.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+import subprocess
+from . import metrics
+from .pdf_utils import load_pdf_to_db
+from .summaries import SummaryStore, SummaryWorker
+
+# Variable de entorno con los ajustes de Config del maestro (p. ej. --replication_dir)
+WRITER_CONFIG_ENV = "ENTRENAMIENTO_WRITER_CONFIG"
+
+
+def apply_write(operation, payload, model_manager, vector_db, summarizer=None):
+    """
+    Aplica una operación de escritura sobre la base de datos vectorial
+
+    Args:
+        operation: add_text, load_pdf, remove_source o clear_all
+        payload: Parámetros de la operación
+        model_manager: Instancia de ModelManager para generar embeddings
+        vector_db: Instancia de VectorDatabase sobre la que escribir
+        summarizer: SummaryWorker opcional (resume los PDFs nuevos e invalida los eliminados)
+
+    Returns:
+        Diccionario con el resultado de la operación
+    """
+    if operation == "add_text":
+        embedding = model_manager.generate_embeddings(payload["text"])
+        doc_id = vector_db.add_document(payload["text"], embedding, payload.get("metadata", {}))
+        vector_db.save()
+        return {"doc_id": doc_id}
+
+    if operation == "load_pdf":
+        chunks_added = load_pdf_to_db(
+            payload["pdf_path"],
+            model_manager,
+            vector_db,
+            chunk_size=payload.get("chunk_size", 1000),
+            chunk_overlap=payload.get("chunk_overlap", 200),
+            source_name=payload.get("source_name"),
+            summarizer=summarizer
+        )
+        return {"chunks_added": chunks_added}
+
+    if operation == "remove_source":
+        removed_sources = [
+            name for name in vector_db.sources if payload["pdf_name"].lower() in name.lower()
+        ]
+        removed_count = vector_db.remove_source(payload["pdf_name"])
+        if removed_count:
+            vector_db.save()
+            if summarizer is not None:
+                summarizer.invalidate(removed_sources)
+        return {"removed": removed_count, "remaining": len(vector_db.documents)}
+
+    if operation == "clear_all":
+        vector_db.clear_all()
+        if summarizer is not None:
+            summarizer.clear()
+        return {"remaining": len(vector_db.documents)}
+
+    raise ValueError(f"Operación de escritura desconocida: {operation}")
+
+
+class IngestQueue:
+    """
+    Cola de operaciones de escritura en disco, compartida entre los workers
+    (que encolan y esperan el resultado) y el proceso escritor (que las aplica)
+
+    El escritor toma cada trabajo renombrándolo de <id>.json a <id>.running y
+    actualiza cada segundo el archivo writer.json; si deja de hacerlo durante
+    heartbeat_timeout segundos, los workers cancelan sus trabajos pendientes en
+    lugar de esperar a INGEST_TIMEOUT. También publica sus métricas de ingesta
+    en writer_metrics.prom, que los workers exponen en /api/metrics.
+    """
+    def __init__(self, queue_dir, heartbeat_timeout=15):
+        self.queue_dir = queue_dir
+        self.heartbeat_timeout = heartbeat_timeout
+        self.jobs_dir = os.path.join(queue_dir, "jobs")
+        self.results_dir = os.path.join(queue_dir, "results")
+        self.files_dir = os.path.join(queue_dir, "files")
+        self.heartbeat_path = os.path.join(queue_dir, "writer.json")
+        self.metrics_path = os.path.join(queue_dir, "writer_metrics.prom")
+        for directory in (self.jobs_dir, self.results_dir, self.files_dir):
+            os.makedirs(directory, exist_ok=True)
+
+    def _write_json(self, path, data):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def publish_metrics(self, text):
+        """Publica las métricas del escritor (texto de Prometheus)"""
+        tmp_path = self.metrics_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, self.metrics_path)
+
+    def writer_metrics(self):
+        """Últimas métricas publicadas por el escritor, o None si aún no hay"""
+        try:
+            with open(self.metrics_path, 'r', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def submit(self, operation, payload, timeout=600, poll_interval=0.1):
+        """
+        Encola una operación y espera a que el escritor la aplique
+
+        Returns:
+            Resultado de la operación
+        """
+        job_id = f"{time.time_ns():020d}-{uuid.uuid4().hex}"
+        self._write_json(
+            os.path.join(self.jobs_dir, job_id + ".json"),
+            {"id": job_id, "operation": operation, "payload": payload}
+        )
+
+        result_path = os.path.join(self.results_dir, job_id + ".json")
+        submitted_at = time.time()
+        deadline = submitted_at + timeout
+        while time.time() < deadline:
+            if os.path.exists(result_path):
+                with open(result_path, 'r', encoding='utf-8') as f:
+                    result = json.load(f)
+                os.remove(result_path)
+                if "error" in result:
+                    raise RuntimeError(result["error"])
+                return result["result"]
+            # Escritor caído: no esperar hasta el timeout. Si ya había tomado el
+            # trabajo, al reiniciarse lo marca como fallido y se recibe ese error
+            if not self.writer_alive(since=submitted_at) and self._cancel(job_id):
+                raise RuntimeError(f"El proceso escritor no está disponible, no se aplicó la operación {operation}")
+            time.sleep(poll_interval)
+
+        if not self._cancel(job_id):
+            self._abandon(job_id)
+        raise TimeoutError(f"El escritor no completó la operación {operation} a tiempo")
+
+    def _cancel(self, job_id):
+        """Retira un trabajo que el escritor todavía no ha tomado"""
+        try:
+            os.remove(os.path.join(self.jobs_dir, job_id + ".json"))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _abandon(self, job_id):
+        """
+        Indica al escritor que nadie espera ya el resultado de un trabajo en curso.
+        La marca y el resultado los borra quien llegue después (este worker o complete).
+        """
+        marker_path = os.path.join(self.results_dir, job_id + ".abandoned")
+        open(marker_path, 'w').close()
+        if os.path.exists(os.path.join(self.results_dir, job_id + ".json")):
+            self._discard_result(job_id)
+
+    def _discard_result(self, job_id):
+        for extension in (".json", ".abandoned"):
+            try:
+                os.remove(os.path.join(self.results_dir, job_id + extension))
+            except FileNotFoundError:
+                pass
+
+    def writer_alive(self, since=None):
+        """
+        True si el escritor actualizó su latido hace menos de heartbeat_timeout
+        segundos (contando desde since si es posterior, para dar tiempo a que arranque)
+        """
+        try:
+            last_seen = os.path.getmtime(self.heartbeat_path)
+        except FileNotFoundError:
+            last_seen = 0
+        if since is not None:
+            last_seen = max(last_seen, since)
+        return time.time() - last_seen < self.heartbeat_timeout
+
+    def start_heartbeat(self, interval=1.0):
+        """Actualiza writer.json desde un hilo propio mientras el proceso escritor siga vivo"""
+        def beat():
+            while True:
+                self._write_json(self.heartbeat_path, {"pid": os.getpid(), "updated_at": time.time()})
+                time.sleep(interval)
+
+        thread = threading.Thread(target=beat, name="writer-heartbeat", daemon=True)
+        thread.start()
+        return thread
+
+    def pending_jobs(self):
+        """Trabajos pendientes en orden de llegada"""
+        names = sorted(n for n in os.listdir(self.jobs_dir) if n.endswith(".json"))
+        jobs = []
+        for name in names:
+            try:
+                with open(os.path.join(self.jobs_dir, name), 'r', encoding='utf-8') as f:
+                    jobs.append(json.load(f))
+            except FileNotFoundError:
+                # El worker lo canceló entre listdir y open
+                continue
+            except ValueError:
+                job = {"id": name[:-len(".json")]}
+                print(f"Trabajo {job['id']} ilegible, se descarta")
+                if self.claim(job):
+                    self.complete(job, error="El trabajo encolado no es un JSON válido")
+        return jobs
+
+    def claim(self, job):
+        """Marca un trabajo como en curso; False si el worker lo canceló antes"""
+        try:
+            os.replace(
+                os.path.join(self.jobs_dir, job["id"] + ".json"),
+                os.path.join(self.jobs_dir, job["id"] + ".running")
+            )
+            return True
+        except FileNotFoundError:
+            return False
+
+    def complete(self, job, result=None, error=None):
+        data = {"error": error} if error is not None else {"result": result}
+        self._write_json(os.path.join(self.results_dir, job["id"] + ".json"), data)
+        # El worker dejó de esperar (timeout): nadie leerá el resultado
+        if os.path.exists(os.path.join(self.results_dir, job["id"] + ".abandoned")):
+            self._discard_result(job["id"])
+        try:
+            os.remove(os.path.join(self.jobs_dir, job["id"] + ".running"))
+        except FileNotFoundError:
+            pass
+
+    def fail_interrupted(self):
+        """Marca como fallidos los trabajos que estaban en curso cuando el escritor terminó"""
+        for name in sorted(os.listdir(self.jobs_dir)):
+            if name.endswith(".running"):
+                job = {"id": name[:-len(".running")]}
+                print(f"Trabajo {job['id']} interrumpido por un reinicio del escritor")
+                self.complete(job, error="El proceso escritor se reinició mientras aplicaba la operación")
+
+
+def run_writer(config, poll_interval=0.2):
+    """Bucle del proceso escritor: aplica en orden las operaciones encoladas"""
+    from .model_manager import ModelManager
+    from .vector_database import VectorDatabase
+
+    queue = IngestQueue(config.INGEST_QUEUE_PATH)
+    queue.start_heartbeat()
+    queue.fail_interrupted()
+
+    model_manager = ModelManager(config)
+    vector_db = VectorDatabase(config)
+    model_manager.load_embedding_model()
+    # Con resúmenes activados el escritor carga el LLM al recibir el primer PDF
+    summarizer = None
+    if config.SUMMARIES_ENABLED:
+        summarizer = SummaryWorker(model_manager, vector_db, SummaryStore(config.SUMMARY_DIR), config)
+    # Un escritor reiniciado empieza de cero, como cualquier proceso de Prometheus
+    queue.publish_metrics(metrics.render_writer())
+    print(f"Proceso escritor iniciado (pid {os.getpid()})")
+
+    while True:
+        for job in queue.pending_jobs():
+            if not queue.claim(job):
+                continue
+            try:
+                result = apply_write(job["operation"], job["payload"], model_manager, vector_db, summarizer)
+                # Antes de responder, para que el worker ya vea la ingesta en sus métricas
+                queue.publish_metrics(metrics.render_writer())
+                queue.complete(job, result=result)
+            except Exception as e:
+                print(f"Error al aplicar {job['operation']}: {str(e)}")
+                queue.complete(job, error=str(e))
+        time.sleep(poll_interval)
+
+
+class WriterProcess:
+    """
+    Proceso escritor lanzado por el maestro de gunicorn, que lo vuelve a lanzar
+    si termina (por ejemplo, si falla la carga de un modelo)
+
+    El escritor crea su propia Config; los valores cambiados en la instancia
+    del maestro (línea de comandos, perfil de ajuste) se le pasan en
+    WRITER_CONFIG_ENV para que use los mismos.
+
+    Args:
+        config: Instancia de Config del maestro
+        restart_delay: Segundos mínimos entre dos arranques
+    """
+    def __init__(self, config, restart_delay=5):
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.env = dict(os.environ)
+        self.env["PYTHONPATH"] = os.pathsep.join(filter(None, [project_root, self.env.get("PYTHONPATH")]))
+        self.env[WRITER_CONFIG_ENV] = json.dumps({
+            name: value for name, value in vars(config).items() if name.isupper()
+        })
+        self.restart_delay = restart_delay
+        self.process = None
+        self.started_at = 0
+
+    def start(self):
+        self.process = subprocess.Popen([sys.executable, "-m", "Entrenamiento.serving"], env=self.env)
+        self.started_at = time.time()
+
+    def ensure_running(self):
+        """Relanza el escritor si terminó (se llama en cada iteración del maestro)"""
+        if self.process.poll() is None or time.time() - self.started_at < self.restart_delay:
+            return
+        print("El proceso escritor terminó, reiniciándolo...")
+        self.start()
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+
+def serve_with_workers(config, workers):
+    """
+    Lanza el servicio con gunicorn (pre-fork) y un proceso escritor dedicado
+
+    Args:
+        config: Instancia de Config
+        workers: Número de procesos worker
+    """
+    try:
+        from gunicorn.app.base import BaseApplication
+        from gunicorn.arbiter import Arbiter
+    except ImportError:
+        raise RuntimeError("El modo con varios workers requiere gunicorn (incluido en requirements.txt)")
+
+    from .model_manager import ModelManager
+    from .vector_database import VectorDatabase
+    from .startup import ComponentLoader
+    from .app import FlaskService
+
+    # Proceso escritor: único dueño de la ingesta. Se lanza como proceso
+    # independiente para que los workers no lo hereden al hacer fork
+    writer = WriterProcess(config, restart_delay=config.WRITER_RESTART_DELAY)
+    writer.start()
+
+    # El índice se carga en el maestro antes del fork para compartirlo entre workers
+    vector_db = VectorDatabase(config, read_only=True)
+    model_manager = ModelManager(config)
+    loader = ComponentLoader()
+    loader.mark_ready("vector_db")
+    service = FlaskService(
+        model_manager, vector_db, config,
+        loader=loader,
+        ingest_queue=IngestQueue(config.INGEST_QUEUE_PATH, heartbeat_timeout=config.WRITER_HEARTBEAT_TIMEOUT)
+    )
+
+    def post_fork(server, worker):
+        # Los hilos no sobreviven al fork: cada worker carga sus modelos en segundo
+        # plano (los pesos GGUF se leen con mmap y el sistema los comparte)
+        loader.start("embedding_model", model_manager.load_embedding_model)
+        loader.start("llm", model_manager.load_model)
+
+    def on_exit(server):
+        writer.stop()
+
+    class WriterArbiter(Arbiter):
+        # El bucle del maestro gestiona los workers una vez por segundo;
+        # se aprovecha para vigilar también al escritor, sin hilos antes del fork
+        def manage_workers(self):
+            writer.ensure_running()
+            super().manage_workers()
+
+    class ProductionApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{config.HOST}:{config.PORT}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("threads", config.WORKER_THREADS)
+            self.cfg.set("timeout", config.WORKER_TIMEOUT)
+            self.cfg.set("preload_app", True)
+            self.cfg.set("post_fork", post_fork)
+            self.cfg.set("on_exit", on_exit)
+
+        def load(self):
+            return service.app
+
+        def run(self):
+            WriterArbiter(self).run()
+
+    print(f"Iniciando servidor de producción en http://{config.HOST}:{config.PORT} con {workers} workers")
+    ProductionApplication().run()
+
+
+if __name__ == "__main__":
+    from Entrenamiento.config import Config
+
+    config = Config()
+    for name, value in json.loads(os.environ.get(WRITER_CONFIG_ENV, "{}")).items():
+        setattr(config, name, value)
+    run_writer(config)
@@ -0,0 +1,147 @@
+# startup.py
+"""
+Carga en segundo plano de los componentes pesados (modelos e índice vectorial)
+"""
+import threading
+import time
+import traceback
+
+
+class ComponentLoader:
+    """
+    Carga componentes en hilos en segundo plano y lleva el estado de cada uno
+    (pending/loading/ready/failed) junto con sus tiempos de carga.
+    """
+    PENDING = "pending"
+    LOADING = "loading"
+    READY = "ready"
+    FAILED = "failed"
+
+    def __init__(self, started_at=None):
+        self.started_at = started_at if started_at is not None else time.time()
+        self.first_ready_check = None  # Segundos hasta el primer health check exitoso
+        self._components = {}
+        self._lock = threading.Lock()
+
+    def _register(self, name):
+        with self._lock:
+            if name not in self._components:
+                self._components[name] = {
+                    "state": self.PENDING,
+                    "started_at": None,
+                    "finished_at": None,
+                    "load_seconds": None,
+                    "error": None,
+                    "event": threading.Event()
+                }
+            return self._components[name]
+
+    def start(self, name, load_fn, after=()):
+        """
+        Lanza la carga de un componente en un hilo en segundo plano
+
+        Args:
+            name: Nombre del componente
+            load_fn: Función sin argumentos que realiza la carga
+            after: Componentes que deben estar listos antes de iniciar esta carga
+        """
+        component = self._register(name)
+        for dependency in after:
+            self._register(dependency)
+
+        def run():
+            for dependency in after:
+                self.wait(dependency)
+                if self.state(dependency) != self.READY:
+                    self._finish(name, f"Dependencia no disponible: {dependency}")
+                    return
+
+            component["state"] = self.LOADING
+            component["started_at"] = time.time()
+            try:
+                load_fn()
+            except Exception as e:
+                traceback.print_exc()
+                self._finish(name, str(e))
+            else:
+                self._finish(name)
+
+        thread = threading.Thread(target=run, name=f"load-{name}", daemon=True)
+        thread.start()
+        return thread
+
+    def mark_ready(self, name):
+        """Marca como listo un componente que se cargó fuera del cargador"""
+        component = self._register(name)
+        component["started_at"] = component["started_at"] or time.time()
+        self._finish(name)
+
+    def _finish(self, name, error=None):
+        component = self._components[name]
+        component["finished_at"] = time.time()
+        if component["started_at"] is not None:
+            component["load_seconds"] = component["finished_at"] - component["started_at"]
+        component["error"] = error
+        component["state"] = self.FAILED if error else self.READY
+        if error:
+            print(f"Error al cargar el componente {name}: {error}")
+        else:
+            print(f"Componente {name} listo en {component['load_seconds']:.2f}s")
+        component["event"].set()
+
+    def wait(self, name, timeout=None):
+        """
+        Espera a que un componente termine de cargar
+
+        Returns:
+            True si el componente está listo, False si falló o se agotó el tiempo
+        """
+        component = self._register(name)
+        component["event"].wait(timeout)
+        return component["state"] == self.READY
+
+    def state(self, name):
+        return self._register(name)["state"]
+
+    def error(self, name):
+        return self._register(name)["error"]
+
+    def all_ready(self):
+        with self._lock:
+            return all(c["state"] == self.READY for c in self._components.values())
+
+    def overall_state(self):
+        """Estado agregado: ready, loading o failed"""
+        with self._lock:
+            states = [c["state"] for c in self._components.values()]
+        if any(s == self.FAILED for s in states):
+            return self.FAILED
+        if all(s == self.READY for s in states):
+            return self.READY
+        return self.LOADING
+
+    def record_health_check(self):
+        """Registra el tiempo hasta el primer health check con todos los componentes listos"""
+        if self.first_ready_check is None and self.all_ready():
+            self.first_ready_check = time.time() - self.started_at
+            print(f"Servicio listo {self.first_ready_check:.2f}s después del arranque")
+        return self.first_ready_check
+
+    def status(self):
+        """Devuelve el estado de todos los componentes en formato serializable"""
+        now = time.time()
+        with self._lock:
+            items = list(self._components.items())
+
+        components = {}
+        for name, c in items:
+            info = {
+                "state": c["state"],
+                "load_seconds": round(c["load_seconds"], 3) if c["load_seconds"] is not None else None
+            }
+            if c["state"] == self.LOADING and c["started_at"] is not None:
+                info["elapsed_seconds"] = round(now - c["started_at"], 3)
+            if c["error"]:
+                info["error"] = c["error"]
+            components[name] = info
+        return components
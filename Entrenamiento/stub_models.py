@@ -0,0 +1,82 @@
+# stub_models.py
+"""
+Modelos deterministas para benchmarks y pruebas de carga sin descargar ni cargar modelos reales
+
+StubModelManager se comporta como ModelManager (mismo streaming, métricas y
+lock del LLM), pero _create_llm y _create_embedding_model crean objetos simulados
+con la misma interfaz que llama_cpp.Llama y SentenceTransformer.
+"""
+import time
+import zlib
+import numpy as np
+from .model_manager import ModelManager
+
+
+class StubEmbeddingModel:
+    """Embeddings pseudoaleatorios deterministas: el mismo texto produce siempre el mismo vector"""
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+
+    def _encode_one(self, text):
+        rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+        vector = rng.standard_normal(self.dimension).astype('float32')
+        return vector / np.linalg.norm(vector)
+
+    def encode(self, sentences, batch_size=32, **kwargs):
+        if isinstance(sentences, str):
+            return self._encode_one(sentences)
+        return np.array([self._encode_one(text) for text in sentences])
+
+
+class StubLlama:
+    """
+    LLM simulado con la interfaz de llama_cpp.Llama
+
+    Args:
+        prefill_seconds_per_token: Retardo simulado por token del prompt
+        decode_seconds_per_token: Retardo simulado por token generado
+    """
+    def __init__(self, prefill_seconds_per_token=0.0, decode_seconds_per_token=0.0):
+        self.prefill_seconds_per_token = prefill_seconds_per_token
+        self.decode_seconds_per_token = decode_seconds_per_token
+
+    def reset(self):
+        pass
+
+    def tokenize(self, text, add_bos=True, special=False):
+        # Aproximación habitual: unos 4 bytes por token
+        return list(range(max(1, len(text) // 4)))
+
+    def _tokens(self, prompt, max_tokens):
+        seed = zlib.crc32(prompt.encode("utf-8"))
+        words = ("el", "documento", "indica", "que", "la", "información", "principal", "es", "relevante")
+        for i in range(max_tokens):
+            yield " " + words[(seed + i) % len(words)]
+
+    def _stream(self, prompt, max_tokens):
+        if self.prefill_seconds_per_token:
+            time.sleep(self.prefill_seconds_per_token * len(self.tokenize(prompt.encode("utf-8"))))
+        for token in self._tokens(prompt, max_tokens):
+            if self.decode_seconds_per_token:
+                time.sleep(self.decode_seconds_per_token)
+            yield {"choices": [{"text": token, "index": 0, "finish_reason": None}]}
+
+    def __call__(self, prompt, max_tokens=16, temperature=0.8, stream=False, **kwargs):
+        if stream:
+            return self._stream(prompt, max_tokens)
+        text = "".join(chunk["choices"][0]["text"] for chunk in self._stream(prompt, max_tokens))
+        return {"choices": [{"text": text, "index": 0, "finish_reason": "length"}]}
+
+
+class StubModelManager(ModelManager):
+    """ModelManager que carga modelos simulados en lugar de los reales"""
+    def __init__(self, config, prefill_seconds_per_token=0.0, decode_seconds_per_token=0.0):
+        super().__init__(config)
+        self.prefill_seconds_per_token = prefill_seconds_per_token
+        self.decode_seconds_per_token = decode_seconds_per_token
+
+    def _create_llm(self):
+        return StubLlama(self.prefill_seconds_per_token, self.decode_seconds_per_token)
+
+    def _create_embedding_model(self):
+        return StubEmbeddingModel(self.config.VECTOR_DIMENSION)
@@ -0,0 +1,271 @@
+# summaries.py
+"""
+Resúmenes precalculados de los PDFs (por documento y por sección)
+
+Tras la ingesta de un PDF, un hilo en segundo plano de baja prioridad genera
+con el LLM un resumen de cada sección (bloques de SUMMARY_SECTION_PAGES páginas)
+y, a partir de ellos, uno del documento completo. Se guardan en SUMMARY_DIR,
+un JSON por fuente, para que las preguntas del tipo "¿Cuáles son los puntos
+principales del documento?" se respondan sin recuperación ni generación.
+
+Cada resumen guarda la fecha de ingesta de la fuente en el catálogo; si la
+fuente se elimina o se vuelve a cargar, el resumen deja de coincidir y no se usa.
+"""
+import os
+import re
+import json
+import time
+import queue
+import hashlib
+import threading
+import unicodedata
+
+# Palabras que indican que se pide un resumen del documento
+SUMMARY_QUERY_PATTERN = re.compile(
+    r"\b(puntos (principales|clave|importantes)|ideas (principales|clave)|resumen|resume(me)?|"
+    r"resumir|sintesis|sintetiza|de que (trata|va)|temas principales)\b"
+)
+# Las preguntas más largas suelen pedir algo concreto aunque contengan esas palabras
+SUMMARY_QUERY_MAX_WORDS = 12
+
+
+def is_summary_query(query):
+    """True si la consulta pide un resumen general del documento"""
+    normalized = unicodedata.normalize("NFKD", query.lower())
+    normalized = "".join(c for c in normalized if not unicodedata.combining(c))
+    if len(normalized.split()) > SUMMARY_QUERY_MAX_WORDS:
+        return False
+    return SUMMARY_QUERY_PATTERN.search(normalized) is not None
+
+
+def source_version(entry):
+    """
+    Versión del contenido de una fuente (entrada del catálogo o resumen guardado).
+    La revisión cambia con cada documento añadido y la fecha de ingesta al volver
+    a crear la fuente tras eliminarla.
+    """
+    return entry.get("ingested_at"), entry.get("revision")
+
+
+class SummaryStore:
+    """Resúmenes guardados en disco, un JSON por fuente"""
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, source):
+        name = hashlib.sha1(source.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, name + ".json")
+
+    def get(self, source):
+        try:
+            with open(self._path(source), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def get_valid(self, source, catalog_entry):
+        """Resumen de la fuente si corresponde a su contenido actual en el catálogo"""
+        summary = self.get(source)
+        if summary is None or catalog_entry is None:
+            return None
+        if source_version(summary) != source_version(catalog_entry):
+            return None
+        return summary
+
+    def put(self, source, summary):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(source)
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    def remove(self, source):
+        try:
+            os.remove(self._path(source))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        if not os.path.exists(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.directory, name))
+
+
+def format_summaries(summaries):
+    """Texto de respuesta a partir de los resúmenes de una o varias fuentes"""
+    parts = []
+    for summary in summaries:
+        lines = [f"Puntos principales de {summary['source']}:", summary["document_summary"]]
+        if len(summary["sections"]) > 1:
+            lines.append("")
+            lines.append("Por secciones:")
+            for section in summary["sections"]:
+                lines.append(f"- {section['title']}: {section['summary']}")
+        parts.append("\n".join(lines))
+    return "\n\n".join(parts)
+
+
+class SummaryWorker:
+    """
+    Genera los resúmenes en un hilo en segundo plano
+
+    El hilo baja su prioridad en el planificador (SUMMARY_NICE) y, antes de
+    cada generación, espera a que el LLM quede libre para no retrasar las
+    consultas de los usuarios.
+
+    Args:
+        model_manager: Instancia de ModelManager (el LLM se carga si hace falta)
+        vector_db: Instancia de VectorDatabase, para comprobar que la fuente sigue vigente
+        store: SummaryStore donde se guardan los resúmenes
+        config: Instancia de Config
+    """
+    def __init__(self, model_manager, vector_db, store, config):
+        self.model_manager = model_manager
+        self.vector_db = vector_db
+        self.store = store
+        self.config = config
+        self._jobs = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def submit(self, source, chunks, page_ranges, total_pages):
+        """Encola el resumen de una fuente recién ingerida"""
+        entry = self.vector_db.sources.get(source)
+        self._jobs.put({
+            "source": source,
+            "version": source_version(entry) if entry is not None else None,
+            "chunks": list(chunks),
+            "page_ranges": list(page_ranges),
+            "total_pages": total_pages
+        })
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="summary-worker", daemon=True)
+                self._thread.start()
+
+    def invalidate(self, sources):
+        """Descarta los resúmenes de las fuentes eliminadas"""
+        for source in sources:
+            self.store.remove(source)
+
+    def clear(self):
+        self.store.clear()
+
+    def pending(self):
+        return self._jobs.qsize()
+
+    def _lower_priority(self):
+        # En Linux la prioridad se aplica al hilo (cada hilo es una tarea del planificador)
+        if not hasattr(os, "setpriority"):
+            return
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), self.config.SUMMARY_NICE)
+        except (OSError, AttributeError) as e:
+            print(f"No se pudo bajar la prioridad del hilo de resúmenes: {str(e)}")
+
+    def _run(self):
+        self._lower_priority()
+        while True:
+            job = self._jobs.get()
+            try:
+                self._summarize(job)
+            except Exception as e:
+                print(f"Error al resumir {job['source']}: {str(e)}")
+
+    def _is_current(self, job):
+        entry = self.vector_db.sources.get(job["source"])
+        return entry is not None and source_version(entry) == job["version"]
+
+    def _generate(self, prompt):
+        # Ceder el LLM a las consultas de los usuarios
+        while self.model_manager.is_busy():
+            time.sleep(0.5)
+        return self.model_manager.generate_response(
+            prompt,
+            max_tokens=self.config.SUMMARY_MAX_TOKENS,
+            temperature=0.3,
+            origin="summary"
+        )
+
+    def _sections(self, job):
+        """Agrupa los fragmentos en secciones de SUMMARY_SECTION_PAGES páginas"""
+        pages_per_section = self.config.SUMMARY_SECTION_PAGES
+        sections = {}
+        for chunk, (page_start, page_end) in zip(job["chunks"], job["page_ranges"]):
+            key = (page_start - 1) // pages_per_section if page_start else 0
+            sections.setdefault(key, []).append((chunk, page_start, page_end))
+
+        result = []
+        for key in sorted(sections):
+            items = sections[key]
+            pages = [p for _, start, end in items for p in (start, end) if p]
+            first, last = (min(pages), max(pages)) if pages else (None, None)
+            title = f"Páginas {first}-{last}" if first else f"Sección {key + 1}"
+            text = "\n".join(chunk for chunk, _, _ in items)[:self.config.SUMMARY_SECTION_CHARS]
+            result.append({"title": title, "page_start": first, "page_end": last, "text": text})
+        return result
+
+    def _source_chunks(self, job):
+        """
+        Fragmentos y páginas de la fuente completa cuando la ingesta amplió una
+        fuente que ya existía (el trabajo solo trae los fragmentos nuevos)
+        """
+        snapshot = self.vector_db.snapshot()
+        entry = snapshot.sources.get(job["source"])
+        if entry is None or entry["chunks"] == len(job["chunks"]):
+            return job
+        documents = [d for d in snapshot.documents if d["metadata"].get("source") == job["source"]]
+        return dict(
+            job,
+            chunks=[d["text"] for d in documents],
+            page_ranges=[(d["metadata"].get("page_start"), d["metadata"].get("page_end")) for d in documents]
+        )
+
+    def _summarize(self, job):
+        started = time.perf_counter()
+        job = self._source_chunks(job)
+        sections = []
+        for section in self._sections(job):
+            if not self._is_current(job):
+                print(f"Resumen de {job['source']} cancelado: la fuente cambió")
+                return
+            prompt = f"""Resume los puntos principales del siguiente texto de un documento en una lista breve.
+Usa ÚNICAMENTE la información del texto.
+
+Texto ({section['title']}):
+{section['text']}"""
+            sections.append({
+                "title": section["title"],
+                "page_start": section["page_start"],
+                "page_end": section["page_end"],
+                "summary": self._generate(prompt)
+            })
+
+        if len(sections) == 1:
+            document_summary = sections[0]["summary"]
+        else:
+            outline = "\n\n".join(f"{s['title']}:\n{s['summary']}" for s in sections)
+            prompt = f"""A partir de estos resúmenes de las secciones de un documento, escribe los puntos principales del documento completo en una lista breve.
+Usa ÚNICAMENTE la información de los resúmenes.
+
+{outline}"""
+            document_summary = self._generate(prompt)
+
+        # La fuente pudo eliminarse o recargarse mientras se generaba
+        if not self._is_current(job):
+            print(f"Resumen de {job['source']} descartado: la fuente cambió")
+            return
+
+        self.store.put(job["source"], {
+            "source": job["source"],
+            "ingested_at": job["version"][0],
+            "revision": job["version"][1],
+            "total_pages": job["total_pages"],
+            "document_summary": document_summary,
+            "sections": sections,
+            "created_at": time.time(),
+            "model": self.config.MODEL_PATH
+        })
+        print(f"Resumen de {job['source']} generado en {time.perf_counter() - started:.1f}s ({len(sections)} secciones)")
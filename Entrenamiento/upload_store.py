@@ -0,0 +1,227 @@
+# upload_store.py
+"""
+Almacenamiento de subidas de PDF por partes (init/append/complete) reanudables
+
+Cada subida se guarda en disco como <id>.part junto con su estado <id>.json.
+Los datos se escriben directamente desde el cuerpo de la petición en bloques de
+tamaño fijo, por lo que la memoria usada no depende del tamaño del archivo. El
+número de bytes recibidos es el tamaño del archivo .part, así que tras una
+conexión caída el cliente reanuda desde ese desplazamiento.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import hashlib
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+_UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadOffsetError(Exception):
+    """El desplazamiento enviado no coincide con los bytes ya recibidos"""
+    def __init__(self, expected_offset):
+        super().__init__(f"Desplazamiento incorrecto, se esperaba {expected_offset}")
+        self.expected_offset = expected_offset
+
+
+class UploadChecksumError(ValueError):
+    """El contenido recibido no coincide con el hash declarado; la subida vuelve a empezar desde 0"""
+    def __init__(self):
+        super().__init__("El hash SHA-256 no coincide con el contenido recibido, vuelve a enviar el archivo desde el desplazamiento 0")
+        self.expected_offset = 0
+
+
+class ChunkedUploadStore:
+    def __init__(self, upload_dir, buffer_size=64 * 1024, expiration=24 * 3600):
+        self.upload_dir = upload_dir
+        self.buffer_size = buffer_size
+        self.expiration = expiration
+        os.makedirs(upload_dir, exist_ok=True)
+
+    def _path(self, upload_id, extension):
+        if not _UPLOAD_ID_RE.match(upload_id or ""):
+            raise KeyError(upload_id)
+        return os.path.join(self.upload_dir, f"{upload_id}.{extension}")
+
+    def _load_state(self, upload_id):
+        try:
+            with open(self._path(upload_id, "json"), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise KeyError(upload_id)
+
+    def _save_state(self, state):
+        path = self._path(state["upload_id"], "json")
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(path + ".tmp", path)
+
+    @contextmanager
+    def _locked(self, upload_id):
+        """Evita que dos peticiones (o dos workers) escriban la misma subida a la vez"""
+        with open(self._path(upload_id, "lock"), 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def create(self, filename, total_size, sha256, options=None):
+        """
+        Inicia una subida
+
+        Args:
+            filename: Nombre original del PDF
+            total_size: Tamaño total en bytes
+            sha256: Hash SHA-256 (hex) del contenido completo
+            options: Parámetros de ingesta (chunk_size, chunk_overlap)
+
+        Returns:
+            Estado de la subida creada
+        """
+        if total_size <= 0:
+            raise ValueError("El tamaño del archivo debe ser mayor que 0")
+        if not re.match(r"^[0-9a-fA-F]{64}$", sha256 or ""):
+            raise ValueError("Se requiere el hash SHA-256 del archivo en hexadecimal")
+
+        self.cleanup_expired()
+
+        upload_id = uuid.uuid4().hex
+        now = time.time()
+        state = {
+            "upload_id": upload_id,
+            "filename": filename,
+            "total_size": total_size,
+            "sha256": sha256.lower(),
+            "options": options or {},
+            "created_at": now,
+            "updated_at": now
+        }
+        open(self._path(upload_id, "part"), 'wb').close()
+        self._save_state(state)
+        return self.status(upload_id)
+
+    def status(self, upload_id):
+        """Estado de la subida, incluido el desplazamiento desde el que reanudar"""
+        state = self._load_state(upload_id)
+        try:
+            state["offset"] = os.path.getsize(self._path(upload_id, "part"))
+            state["verified"] = False
+        except FileNotFoundError:
+            # Hash ya verificado (el .part pasó a .pdf) o subida descartada
+            if not os.path.exists(self._path(upload_id, "pdf")):
+                raise KeyError(upload_id)
+            state["offset"] = state["total_size"]
+            state["verified"] = True
+        state["complete"] = state["offset"] == state["total_size"]
+        return state
+
+    def append(self, upload_id, offset, stream):
+        """
+        Escribe en disco el contenido de stream a partir de offset
+
+        Args:
+            upload_id: Identificador de la subida
+            offset: Desplazamiento en bytes que el cliente cree haber enviado
+            stream: Objeto con read(n) (por ejemplo request.stream)
+
+        Returns:
+            Nuevo desplazamiento tras escribir
+        """
+        state = self._load_state(upload_id)
+        part_path = self._path(upload_id, "part")
+
+        with self._locked(upload_id):
+            try:
+                received = os.path.getsize(part_path)
+            except FileNotFoundError:
+                if os.path.exists(self._path(upload_id, "pdf")):
+                    # Ya recibida y verificada: solo falta complete
+                    raise UploadOffsetError(state["total_size"])
+                raise KeyError(upload_id)
+            if offset != received:
+                raise UploadOffsetError(received)
+
+            with open(part_path, 'ab') as f:
+                while True:
+                    block = stream.read(self.buffer_size)
+                    if not block:
+                        break
+                    if received + len(block) > state["total_size"]:
+                        raise ValueError("Los datos enviados superan el tamaño declarado")
+                    f.write(block)
+                    received += len(block)
+
+        state["updated_at"] = time.time()
+        self._save_state(state)
+        return received
+
+    def complete(self, upload_id):
+        """
+        Verifica el tamaño y el hash de la subida
+
+        Si el hash no coincide, el archivo recibido se vacía y se lanza
+        UploadChecksumError: el cliente debe volver a enviarlo desde el principio.
+        Una subida ya verificada se puede volver a completar (por ejemplo, si
+        falló la ingesta) sin enviar de nuevo los datos.
+
+        Returns:
+            (ruta del PDF completo, estado de la subida)
+        """
+        part_path = self._path(upload_id, "part")
+        pdf_path = self._path(upload_id, "pdf")
+        with self._locked(upload_id):
+            state = self.status(upload_id)
+            if state["verified"]:
+                stored = self._load_state(upload_id)
+                stored["updated_at"] = time.time()
+                self._save_state(stored)
+                return pdf_path, state
+            if not state["complete"]:
+                raise UploadOffsetError(state["offset"])
+
+            digest = hashlib.sha256()
+            with open(part_path, 'rb') as f:
+                for block in iter(lambda: f.read(self.buffer_size), b""):
+                    digest.update(block)
+
+            if digest.hexdigest() != state["sha256"]:
+                open(part_path, 'wb').close()
+                stored = self._load_state(upload_id)
+                stored["updated_at"] = time.time()
+                self._save_state(stored)
+                raise UploadChecksumError()
+
+            os.replace(part_path, pdf_path)
+        return pdf_path, state
+
+    def discard(self, upload_id):
+        """Elimina todos los archivos de una subida"""
+        for extension in ("part", "pdf", "json", "lock"):
+            try:
+                os.remove(self._path(upload_id, extension))
+            except FileNotFoundError:
+                pass
+
+    def cleanup_expired(self):
+        """Elimina las subidas sin actividad durante más de `expiration` segundos"""
+        now = time.time()
+        for name in os.listdir(self.upload_dir):
+            upload_id, extension = os.path.splitext(name)
+            if extension != ".json" or not _UPLOAD_ID_RE.match(upload_id):
+                continue
+            try:
+                state = self._load_state(upload_id)
+            except (KeyError, ValueError):
+                continue
+            if now - state.get("updated_at", 0) > self.expiration:
+                self.discard(upload_id)
@@ -3,111 +3,582 @@
 Clase para gestionar la base de datos vectorial
 """
 import os
+import time
 import numpy as np
 import faiss
 import pickle
 import json
+import threading
+import itertools
+from contextlib import contextmanager
+from .metrics import stage
+from .document_store import has_documents, write_documents, load_documents, MappedDocuments
+from .replication import ReplicationLog
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+class DocumentList:
+    """
+    Documentos de una instantánea: los `count` primeros de una lista que las
+    instantáneas siguientes comparten y amplían añadiendo al final
+    
+    Se usa como la lista de documentos (len, índice, iteración), igual que
+    MappedDocuments.
+    """
+    __slots__ = ("_items", "_count")
+    
+    def __init__(self, items, count=None):
+        self._items = items
+        self._count = len(items) if count is None else count
+        
+    def __len__(self):
+        return self._count
+        
+    def __getitem__(self, position):
+        if position < 0:
+            position += self._count
+        if not 0 <= position < self._count:
+            raise IndexError(position)
+        return self._items[position]
+        
+    def __iter__(self):
+        return itertools.islice(self._items, self._count)
+        
+    def extended(self, new_documents):
+        """Lista con los documentos añadidos; esta sigue viendo los mismos documentos"""
+        items = self._items
+        if len(items) != self._count:
+            # Otra escritura ya amplió la lista compartida a partir de esta versión
+            items = items[:self._count]
+        items.extend(new_documents)
+        return DocumentList(items)
+
+
+class IndexGuard:
+    """
+    Búsquedas y altas en un índice FAISS compartido entre instantáneas
+    
+    Puede haber varias búsquedas a la vez, pero index.add (que puede realojar
+    los vectores del índice) espera a que terminen y las nuevas esperan a él.
+    """
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        
+    @contextmanager
+    def reading(self):
+        with self._condition:
+            while self._writing:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._condition.notify_all()
+                    
+    @contextmanager
+    def writing(self):
+        with self._condition:
+            while self._writing:
+                self._condition.wait()
+            self._writing = True
+            while self._readers:
+                self._condition.wait()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+def index_rows(index, count):
+    """El índice si tiene exactamente count vectores; si no, una copia con los count primeros"""
+    if index.ntotal == count:
+        return index
+    truncated = faiss.IndexFlatL2(index.d)
+    if count:
+        truncated.add(index.reconstruct_n(0, count))
+    return truncated
+
+
+class Snapshot:
+    """
+    Versión inmutable de la base de datos: índice FAISS, documentos y catálogo.
+    Nunca se modifica después de publicarse; cada escritura crea una nueva.
+    
+    Las altas añaden al final del índice y de la lista de documentos de la
+    versión anterior en lugar de copiarlos: cada instantánea solo ve sus
+    len(documents) primeras filas y descarta las posteriores al buscar.
+    """
+    __slots__ = ("index", "documents", "sources", "generation")
+    
+    def __init__(self, index, documents, sources, generation):
+        self.index = index
+        self.documents = documents
+        # Catálogo por fuente (fragmentos, caracteres, páginas, fecha de ingesta...)
+        self.sources = sources
+        # Número de versión en memoria, crece con cada escritura
+        self.generation = generation
+
 
 class VectorDatabase:
-    def __init__(self, config):
+    def __init__(self, config, autoload=True, read_only=False):
         self.config = config
         self.vector_dimension = config.VECTOR_DIMENSION
         self.db_path = config.VECTOR_DB_PATH
-        self.index = None
-        self.documents = []
-        self.initialize_db()
+        # Los lectores toman la instantánea actual sin bloqueo (una lectura de
+        # atributo) y la usan durante toda la operación. Los escritores construyen
+        # la siguiente versión bajo _write_lock y la publican con una asignación;
+        # las versiones antiguas se liberan cuando ningún lector las referencia.
+        self._snapshot = Snapshot(None, [], {}, 0)
+        self._write_lock = threading.RLock()
+        # Las altas amplían el índice que aún usan las búsquedas en curso
+        self._index_guard = IndexGuard()
+        # Versión publicada en disco que corresponde a los datos en memoria
+        self.version = 0
+        self._version_stamp = None
+        # En modo solo lectura (workers de producción) el índice y los documentos
+        # se abren con memory-mapping y los cambios se reciben recargando nuevas versiones
+        self.read_only = read_only
+        # Exportación para réplicas: cambios aplicados desde el último guardado,
+        # que se publican como delta de la siguiente versión
+        self.changelog = None
+        self._changes = []
+        if not read_only and getattr(config, "REPLICATION_DIR", None):
+            self.changelog = ReplicationLog(
+                config.REPLICATION_DIR,
+                snapshot_every=config.REPLICATION_SNAPSHOT_EVERY,
+                keep_snapshots=config.REPLICATION_KEEP_SNAPSHOTS
+            )
+        # Con autoload=False la carga se hace después llamando a initialize_db
+        # (por ejemplo desde un hilo en segundo plano)
+        if autoload:
+            self.initialize_db()
+        
+    @property
+    def index(self):
+        return self._snapshot.index
+        
+    @property
+    def documents(self):
+        return self._snapshot.documents
+        
+    @property
+    def sources(self):
+        return self._snapshot.sources
+        
+    @property
+    def generation(self):
+        return self._snapshot.generation
+        
+    def snapshot(self):
+        """Instantánea actual; los datos que contiene no cambian aunque haya escrituras"""
+        return self._snapshot
+        
+    def _swap(self, index, documents, sources):
+        """Publica una nueva instantánea (llamar con _write_lock tomado)"""
+        if isinstance(documents, list):
+            documents = DocumentList(documents)
+        self._snapshot = Snapshot(index, documents, sources, self._snapshot.generation + 1)
+        
+    def _record_change(self, *change):
+        """Anota un cambio para el delta de la próxima versión (solo si se exporta a réplicas)"""
+        if self.changelog is not None:
+            self._changes.append(change)
+            
+    def _export_changes(self, snapshot):
+        """Publica los cambios de la versión recién guardada para las réplicas"""
+        if self.changelog is None:
+            return
+        changes, self._changes = self._changes, []
+        try:
+            self.changelog.publish(self.version, changes, snapshot)
+        except Exception as e:
+            # La siguiente versión se exportará como instantánea completa
+            print(f"Error al exportar la versión v{self.version} para réplicas: {str(e)}")
+        
+    @contextmanager
+    def _file_lock(self, exclusive):
+        """
+        Bloqueo entre procesos sobre los archivos de la base de datos.
+        El escritor lo toma en modo exclusivo y los lectores en modo compartido
+        para no leer un índice y unos documentos de versiones distintas.
+        """
+        if fcntl is None:
+            yield
+            return
+            
+        if not os.path.exists(self.db_path):
+            os.makedirs(self.db_path)
+            
+        with open(os.path.join(self.db_path, ".lock"), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                
+    def _read_index(self, index_path):
+        """Lee el índice FAISS, con memory-mapping de solo lectura si está configurado"""
+        if self.read_only and getattr(self.config, "VECTOR_DB_MMAP", False):
+            try:
+                return faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except Exception as e:
+                print(f"No se pudo abrir el índice con mmap, se carga en memoria: {str(e)}")
+        return faiss.read_index(index_path)
+        
+    def _read_documents(self):
+        """
+        Lee los documentos guardados. Los workers de solo lectura los abren con
+        memory-mapping; las bases de datos antiguas (documents.pkl) se cargan en
+        memoria y se convierten al formato nuevo en el siguiente guardado.
+        """
+        if has_documents(self.db_path):
+            if self.read_only and getattr(self.config, "VECTOR_DB_MMAP", False):
+                return MappedDocuments(self.db_path)
+            return load_documents(self.db_path)
+            
+        docs_path = os.path.join(self.db_path, "documents.pkl")
+        if os.path.exists(docs_path):
+            with open(docs_path, 'rb') as f:
+                return pickle.load(f)
+        return None
+        
+    def _write_documents(self, documents):
+        """Guarda los documentos y elimina el archivo del formato antiguo si existe"""
+        write_documents(self.db_path, documents, self.vector_dimension)
+        legacy_path = os.path.join(self.db_path, "documents.pkl")
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+        
+    def _version_path(self):
+        return os.path.join(self.db_path, "version.json")
+        
+    def _stat_version(self):
+        """Firma barata (mtime, tamaño) del archivo de versión para detectar cambios"""
+        try:
+            st = os.stat(self._version_path())
+            return (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return None
+            
+    def _read_version(self):
+        try:
+            with open(self._version_path(), 'r', encoding='utf-8') as f:
+                return int(json.load(f).get("version", 0))
+        except (FileNotFoundError, ValueError):
+            return 0
+            
+    def _publish_version(self):
+        """Incrementa la versión en disco para avisar a los lectores de que hay datos nuevos"""
+        self.version = max(self.version, self._read_version()) + 1
+        tmp_path = self._version_path() + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": self.version, "updated_at": time.time()}, f)
+        os.replace(tmp_path, self._version_path())
+        self._version_stamp = self._stat_version()
+        
+    def reload_if_stale(self):
+        """
+        Recarga la base de datos si otro proceso publicó una versión más nueva.
+        Solo hace un os.stat cuando no hay cambios.
+        
+        Returns:
+            True si se cargó una nueva versión
+        """
+        stamp = self._stat_version()
+        if stamp is None or stamp == self._version_stamp:
+            return False
+            
+        if self._read_version() <= self.version:
+            self._version_stamp = stamp
+            return False
+            
+        # Si otro hilo ya está recargando, esta petición sigue con la instantánea actual
+        if not self._write_lock.acquire(blocking=False):
+            return False
+        try:
+            if self._stat_version() == self._version_stamp:
+                return False
+            self.initialize_db()
+        finally:
+            self._write_lock.release()
+        print(f"Nueva versión de la base de datos cargada: v{self.version}")
+        return True
         
     def initialize_db(self):
         """Inicializa o carga la base de datos vectorial"""
         if not os.path.exists(self.db_path):
             os.makedirs(self.db_path)
             
+        with self._write_lock, self._file_lock(exclusive=False):
+            self._load_from_disk()
+            if self.changelog is not None:
+                self._changes = []
+                self.changelog.ensure_snapshot(self.version, self._snapshot)
+            
+    def _load_from_disk(self):
+        """Lee la versión en disco y la publica como nueva instantánea"""
         index_path = os.path.join(self.db_path, "faiss_index.bin")
-        docs_path = os.path.join(self.db_path, "documents.pkl")
+        self._version_stamp = self._stat_version()
+        self.version = self._read_version()
         
-        if os.path.exists(index_path) and os.path.exists(docs_path):
+        documents = None
+        try:
+            if os.path.exists(index_path):
+                documents = self._read_documents()
+        except Exception as e:
+            print(f"Error al leer los documentos guardados: {str(e)}")
+            
+        if documents is not None:
             # Cargar base de datos existente
             try:
-                self.index = faiss.read_index(index_path)
-                with open(docs_path, 'rb') as f:
-                    self.documents = pickle.load(f)
-                print(f"Base de datos vectorial cargada con {len(self.documents)} documentos")
+                index = self._read_index(index_path)
+                self._swap(index, documents, self._load_catalog(documents))
+                print(f"Base de datos vectorial cargada con {len(documents)} documentos")
             except Exception as e:
                 print(f"Error al cargar base de datos existente: {str(e)}")
                 # Si hay error al cargar, crear nueva base de datos
-                self.index = faiss.IndexFlatL2(self.vector_dimension)
-                self.documents = []
+                self._swap(faiss.IndexFlatL2(self.vector_dimension), [], {})
                 print("Se creó una nueva base de datos debido a un error al cargar la existente")
         else:
             # Crear nueva base de datos
-            self.index = faiss.IndexFlatL2(self.vector_dimension)
-            self.documents = []
+            self._swap(faiss.IndexFlatL2(self.vector_dimension), [], {})
             print("Nueva base de datos vectorial creada")
             
+    def _catalog_path(self):
+        return os.path.join(self.db_path, "catalog.json")
+        
+    def _load_catalog(self, documents):
+        """
+        Carga el catálogo por fuente guardado junto a los documentos.
+        Si no existe o no cuadra con los documentos (bases de datos antiguas), se reconstruye.
+        """
+        try:
+            with open(self._catalog_path(), 'r', encoding='utf-8') as f:
+                sources = json.load(f)
+            if sum(entry["chunks"] for entry in sources.values()) == len(documents):
+                return sources
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+            
+        print("Reconstruyendo el catálogo de fuentes a partir de los documentos...")
+        return self._build_catalog(documents)
+        
+    def _build_catalog(self, documents):
+        sources = {}
+        for doc in documents:
+            self._catalog_add(sources, doc)
+        return sources
+        
+    @staticmethod
+    def _catalog_add(sources, document):
+        """Actualiza la entrada de la fuente de un documento en el catálogo"""
+        metadata = document["metadata"]
+        source = metadata.get("source", "Unknown")
+        text = document["text"]
+        now = time.time()
+        
+        entry = sources.get(source)
+        if entry is None:
+            entry = sources[source] = {
+                "chunks": 0,
+                "characters": 0,
+                "type": metadata.get("type"),
+                "page_start": None,
+                "page_end": None,
+                "total_pages": metadata.get("total_pages"),
+                "embedding_model": metadata.get("embedding_model"),
+                "ingested_at": now,
+                "updated_at": now,
+                # Cambia con cada documento añadido a la fuente (validez de los resúmenes)
+                "revision": 0,
+                "example": text[:100] + "..." if len(text) > 100 else text
+            }
+            
+        entry["chunks"] += 1
+        entry["characters"] += len(text)
+        entry["revision"] = entry.get("revision", 0) + 1
+        entry["updated_at"] = max(entry["updated_at"], now)
+        if metadata.get("page_start") is not None:
+            entry["page_start"] = min(filter(None, [entry["page_start"], metadata["page_start"]]))
+        if metadata.get("page_end") is not None:
+            entry["page_end"] = max(filter(None, [entry["page_end"], metadata["page_end"]]))
+            
+    def _write_catalog(self, sources):
+        catalog_path = self._catalog_path()
+        with open(catalog_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(sources, f)
+        os.replace(catalog_path + ".tmp", catalog_path)
+        
+    def list_sources(self, type_filter=None, offset=0, limit=None):
+        """
+        Lista las fuentes del catálogo ordenadas por nombre, sin recorrer los documentos
+        
+        Args:
+            type_filter: Si se indica, solo fuentes de ese tipo (por ejemplo "pdf")
+            offset: Número de fuentes a saltar
+            limit: Número máximo de fuentes a devolver (None para todas)
+            
+        Returns:
+            (total de fuentes que cumplen el filtro, lista de (nombre, entrada))
+        """
+        items = sorted(self._snapshot.sources.items())
+        if type_filter:
+            items = [
+                (name, entry) for name, entry in items
+                if entry.get("type") == type_filter or name.lower().endswith("." + type_filter)
+            ]
+        end = None if limit is None else offset + limit
+        return len(items), items[offset:end]
+            
     def add_document(self, text, embedding, metadata=None):
         """Añade un documento y su embedding a la base de datos"""
-        if metadata is None:
-            metadata = {}
-            
-        doc_id = len(self.documents)
-        document = {
-            "id": doc_id,
-            "text": text,
-            "metadata": metadata,
-            "embedding": embedding  # Guardar el embedding para posible reconstrucción del índice
-        }
+        return self.add_documents([(text, embedding, metadata)])[0]
+        
+    def add_documents(self, items):
+        """
+        Añade varios documentos publicando una sola instantánea nueva
+        
+        El coste es proporcional a los documentos añadidos (más una copia del
+        catálogo por fuente), no al tamaño de la base de datos; aun así conviene
+        agrupar los documentos (por ejemplo, todos los fragmentos de un PDF) en
+        una sola llamada para publicar una sola versión.
+        
+        Args:
+            items: Lista de (texto, embedding, metadatos)
+            
+        Returns:
+            Lista con los ids de los documentos añadidos
+        """
+        if self.read_only:
+            raise RuntimeError("La base de datos está abierta en modo solo lectura")
+        if not items:
+            return []
+            
+        with self._write_lock:
+            current = self._snapshot
+            new_documents = [
+                {
+                    "id": len(current.documents) + i,
+                    "text": text,
+                    "metadata": metadata if metadata is not None else {},
+                    "embedding": embedding  # Guardar el embedding para posible reconstrucción del índice
+                }
+                for i, (text, embedding, metadata) in enumerate(items)
+            ]
+            self._swap(*self._with_added((current.index, current.documents, current.sources), new_documents))
+            self._record_change("add", new_documents)
+        return [document["id"] for document in new_documents]
+        
+    def _with_added(self, state, new_documents):
+        """
+        Estado (índice, documentos, catálogo) resultante de añadir documentos.
         
-        self.documents.append(document)
+        El índice y la lista de documentos se amplían al final sin copiarlos: el
+        estado recibido sigue viendo solo sus filas. Del catálogo se copian el
+        diccionario y las entradas de las fuentes modificadas.
+        """
+        index, documents, sources = state
+        if not isinstance(documents, DocumentList):
+            # Documentos abiertos con memory-mapping: se cargan una vez en memoria
+            documents = DocumentList(list(documents))
+        # Filas de una escritura anterior que no llegó a publicarse
+        index = index_rows(index, len(documents))
         
-        # Convertir embedding a formato adecuado para FAISS
-        embedding_np = np.array([embedding]).astype('float32')
-        self.index.add(embedding_np)
+        embeddings = np.array([document["embedding"] for document in new_documents]).astype('float32')
+        with self._index_guard.writing():
+            index.add(embeddings)
+        documents = documents.extended(new_documents)
         
-        return doc_id
+        sources = dict(sources)
+        copied = set()
+        for document in new_documents:
+            source = document["metadata"].get("source", "Unknown")
+            if source in sources and source not in copied:
+                sources[source] = dict(sources[source])
+                copied.add(source)
+            self._catalog_add(sources, document)
+        return index, documents, sources
         
-    def search(self, query_embedding, top_k=5):
+    def search(self, query_embedding, top_k=5, snapshot=None):
         """Busca los documentos más similares a un embedding de consulta"""
-        if len(self.documents) == 0:
+        snapshot = snapshot if snapshot is not None else self._snapshot
+        return self.results_from_hits(snapshot, self.search_hits(query_embedding, top_k, snapshot))
+        
+    def search_hits(self, query_embedding, top_k=5, snapshot=None):
+        """
+        Como search, pero devuelve solo (posición del documento, distancia)
+        dentro de la instantánea indicada (o la actual)
+        """
+        snapshot = snapshot if snapshot is not None else self._snapshot
+        documents = snapshot.documents
+        if len(documents) == 0:
             return []  # No hay documentos para buscar
             
         query_embedding = np.array([query_embedding]).astype('float32')
-        distances, indices = self.index.search(query_embedding, min(top_k, len(self.documents)))
-        
-        results = []
-        for i, idx in enumerate(indices[0]):
-            if idx != -1 and idx < len(self.documents):
-                result = {
-                    "document": self.documents[idx],
-                    "distance": float(distances[0][i])
-                }
-                results.append(result)
-                
-        return results
+        with stage("faiss_search"), self._index_guard.reading():
+            index = snapshot.index
+            if index.ntotal > len(documents):
+                # Índice compartido con versiones posteriores: solo las filas de esta
+                params = faiss.SearchParameters(sel=faiss.IDSelectorRange(0, len(documents)))
+                distances, indices = index.search(query_embedding, min(top_k, len(documents)), params=params)
+            else:
+                distances, indices = index.search(query_embedding, min(top_k, len(documents)))
+        
+        return [
+            (int(idx), float(distances[0][i]))
+            for i, idx in enumerate(indices[0])
+            if idx != -1 and idx < len(documents)
+        ]
+        
+    @staticmethod
+    def results_from_hits(snapshot, hits):
+        return [
+            {"document": snapshot.documents[idx], "distance": distance}
+            for idx, distance in hits
+        ]
     
     def save(self):
-        """Guarda la base de datos vectorial en disco"""
+        """Guarda la base de datos vectorial en disco y publica una nueva versión"""
+        if self.read_only:
+            raise RuntimeError("La base de datos está abierta en modo solo lectura")
+            
         if not os.path.exists(self.db_path):
             os.makedirs(self.db_path)
             
         index_path = os.path.join(self.db_path, "faiss_index.bin")
-        docs_path = os.path.join(self.db_path, "documents.pkl")
         
         try:
-            # Guardar el índice FAISS
-            if self.index is not None:
-                faiss.write_index(self.index, index_path)
-            
-            # Guardar los documentos
-            with open(docs_path, 'wb') as f:
-                pickle.dump(self.documents, f)
+            with self._write_lock, self._file_lock(exclusive=True):
+                snapshot = self._snapshot
+                # Escribir en archivos temporales y reemplazar de forma atómica
+                # para que un lector nunca abra un archivo a medio escribir
+                if snapshot.index is not None:
+                    faiss.write_index(index_rows(snapshot.index, len(snapshot.documents)), index_path + ".tmp")
+                    os.replace(index_path + ".tmp", index_path)
+                
+                self._write_documents(snapshot.documents)
+                self._write_catalog(snapshot.sources)
                 
-            print(f"Base de datos guardada con {len(self.documents)} documentos")
+                self._publish_version()
+                self._export_changes(snapshot)
+                
+            print(f"Base de datos guardada con {len(snapshot.documents)} documentos (v{self.version})")
         except Exception as e:
             print(f"Error al guardar la base de datos: {str(e)}")
         
     def load_documents_from_directory(self, directory, model_manager):
         """Carga documentos desde archivos de texto en un directorio y genera embeddings"""
-        loaded_count = 0
+        items = []
         for filename in os.listdir(directory):
             if filename.endswith(".txt") or filename.endswith(".json"):
                 file_path = os.path.join(directory, filename)
@@ -125,44 +596,148 @@ class VectorDatabase:
                         # Generar embedding para el documento
                         embedding = model_manager.generate_embeddings(content)
                         
-                        # Añadir a la base de datos
-                        self.add_document(content, embedding, metadata)
-                        loaded_count += 1
+                        items.append((content, embedding, metadata))
                         
                 except Exception as e:
                     print(f"Error al cargar {file_path}: {str(e)}")
                     
+        # Añadir todos los documentos a la base de datos de una vez
+        self.add_documents(items)
+        loaded_count = len(items)
         print(f"Cargados {loaded_count} documentos del directorio {directory}")
         return loaded_count
         
+    def remove_source(self, source_name):
+        """
+        Elimina los documentos cuya fuente contiene source_name y reconstruye el índice
+        
+        Returns:
+            Número de documentos eliminados
+        """
+        if self.read_only:
+            raise RuntimeError("La base de datos está abierta en modo solo lectura")
+            
+        with self._write_lock:
+            current = self._snapshot
+            state, removed_count = self._with_removed(
+                (current.index, current.documents, current.sources), source_name
+            )
+            if removed_count:
+                self._swap(*state)
+                self._record_change("remove", source_name)
+            return removed_count
+            
+    def _with_removed(self, state, source_name):
+        """Estado resultante de eliminar una fuente y número de documentos eliminados"""
+        index, documents, sources = state
+        kept_documents = []
+        removed_sources = set()
+        removed_count = 0
+        for doc in documents:
+            source = doc["metadata"].get("source", "")
+            if source_name.lower() in source.lower():
+                removed_count += 1
+                removed_sources.add(doc["metadata"].get("source", "Unknown"))
+            else:
+                kept_documents.append(doc)
+                
+        if removed_count == 0:
+            return state, 0
+            
+        # Reconstruir el índice con los embeddings conservados
+        index = faiss.IndexFlatL2(self.vector_dimension)
+        embeddings = [doc["embedding"] for doc in kept_documents if "embedding" in doc]
+        if embeddings:
+            index.add(np.array(embeddings).astype('float32'))
+            
+        sources = {
+            name: entry for name, entry in sources.items()
+            if name not in removed_sources
+        }
+        return (index, kept_documents, sources), removed_count
+        
+    def load_snapshot(self, directory, version):
+        """
+        Carga una instantánea exportada por el primario (réplicas)
+        
+        Args:
+            directory: Directorio con los documentos, catalog.json y manifest.json
+            version: Versión del primario a la que corresponde
+        """
+        with open(os.path.join(directory, "manifest.json"), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest["dimension"] != self.vector_dimension:
+            raise ValueError(
+                f"La instantánea usa embeddings de dimensión {manifest['dimension']} "
+                f"y esta base de datos de {self.vector_dimension}"
+            )
+        documents = load_documents(directory)
+        with open(os.path.join(directory, "catalog.json"), 'r', encoding='utf-8') as f:
+            sources = json.load(f)
+            
+        # El índice no se transfiere: se reconstruye con los embeddings
+        index = faiss.IndexFlatL2(self.vector_dimension)
+        if documents:
+            index.add(np.array([document["embedding"] for document in documents]).astype('float32'))
+            
+        with self._write_lock:
+            self._swap(index, documents, sources)
+            self.version = version
+        print(f"Instantánea v{version} cargada con {len(documents)} documentos")
+        
+    def apply_changes(self, version, changes):
+        """
+        Aplica el delta de una versión exportada por el primario (réplicas).
+        Todos los cambios de la versión se publican en una sola instantánea.
+        """
+        with self._write_lock:
+            current = self._snapshot
+            state = (current.index, current.documents, current.sources)
+            for change in changes:
+                if change[0] == "add":
+                    state = self._with_added(state, change[1])
+                elif change[0] == "remove":
+                    state, _ = self._with_removed(state, change[1])
+                elif change[0] == "clear":
+                    state = (faiss.IndexFlatL2(self.vector_dimension), [], {})
+                else:
+                    raise ValueError(f"Cambio desconocido en el delta v{version}: {change[0]}")
+            self._swap(*state)
+            self.version = version
+        
     def clear_all(self):
         """Elimina todos los documentos de la base de datos"""
-        # Limpiar la lista de documentos
-        self.documents = []
-        
-        # Reiniciar el índice FAISS
-        self.index = faiss.IndexFlatL2(self.vector_dimension)
+        if self.read_only:
+            raise RuntimeError("La base de datos está abierta en modo solo lectura")
+            
+        with self._write_lock, self._file_lock(exclusive=True):
+            self._clear_files()
+            
+    def _clear_files(self):
+        # Publicar una instantánea vacía; las búsquedas en curso terminan con la anterior
+        self._swap(faiss.IndexFlatL2(self.vector_dimension), [], {})
+        self._changes = []
+        self._record_change("clear")
+        snapshot = self._snapshot
         
         # Eliminar archivos existentes si existen
         index_path = os.path.join(self.db_path, "faiss_index.bin")
-        docs_path = os.path.join(self.db_path, "documents.pkl")
         
         try:
             if os.path.exists(index_path):
                 os.remove(index_path)
                 print(f"Archivo eliminado: {index_path}")
-            if os.path.exists(docs_path):
-                os.remove(docs_path)
-                print(f"Archivo eliminado: {docs_path}")
         except Exception as e:
             print(f"Error al eliminar archivos de base de datos: {str(e)}")
             
         # Guardar los cambios (crear archivos vacíos)
         try:
             # Crear una BD vacía
-            faiss.write_index(self.index, index_path)
-            with open(docs_path, 'wb') as f:
-                pickle.dump(self.documents, f)
+            faiss.write_index(snapshot.index, index_path)
+            self._write_documents(snapshot.documents)
+            self._write_catalog(snapshot.sources)
+            self._publish_version()
+            self._export_changes(snapshot)
             print("Archivos de base de datos vacíos creados")
         except Exception as e:
             print(f"Error al guardar la base de datos vacía: {str(e)}")
@@ -0,0 +1,309 @@
+# autotune.py
+"""
+Ajuste automático de los parámetros de llama.cpp y de embeddings para esta máquina
+
+Uso (desde la raíz del proyecto):
+    python main.py --autotune
+    python -m benchmarks.autotune --quick
+    python -m benchmarks.autotune --stub      # comprobación rápida con modelos simulados
+
+Búsqueda por coordenadas, un parámetro cada vez con los mejores valores anteriores:
+    1. N_CTX: el menor tamaño que cabe un prompt RAG típico y que el modelo puede cargar
+    2. N_THREADS: tokens/s de decodificación
+    3. N_THREADS_BATCH y N_BATCH: tokens/s de prefill
+    4. USE_MLOCK: solo si el límite de memoria bloqueable admite el modelo completo
+    5. TORCH_THREADS y EMBEDDING_BATCH_SIZE: fragmentos/s de embeddings
+
+El resultado se escribe en Config.TUNING_PROFILE_PATH y Config lo aplica al arrancar.
+"""
+import argparse
+import copy
+import gc
+import json
+import os
+import platform
+import statistics
+import time
+
+from Entrenamiento.config import Config
+from Entrenamiento.model_manager import ModelManager
+from Entrenamiento.stub_models import StubModelManager
+from benchmarks.run_benchmarks import RESULTS_DIR, quiet
+from benchmarks.synthetic import make_chunks, make_text, make_vocabulary
+
+CONTEXT_CANDIDATES = (2048, 4096, 8192, 16384)
+BATCH_CANDIDATES = (128, 256, 512, 1024)
+EMBEDDING_BATCH_CANDIDATES = (8, 16, 32, 64, 128)
+
+# Prompt RAG típico: 5 fragmentos de 1000 caracteres, instrucciones y respuesta de query-simple
+RAG_CONTEXT_CHARS = 5 * 1000 + 1000
+RAG_RESPONSE_TOKENS = 500
+CHARS_PER_TOKEN = 3.5
+
+
+def thread_candidates():
+    cpus = os.cpu_count() or 1
+    return sorted({max(1, cpus // 4), max(1, cpus // 2), max(1, cpus * 3 // 4), cpus})
+
+
+def required_context():
+    return int(RAG_CONTEXT_CHARS / CHARS_PER_TOKEN) + RAG_RESPONSE_TOKENS
+
+
+def with_settings(config, **settings):
+    tuned = copy.copy(config)
+    for name, value in settings.items():
+        setattr(tuned, name, value)
+    return tuned
+
+
+class Autotuner:
+    """
+    Args:
+        config: Config de partida (ruta de los modelos)
+        quick: Menos repeticiones y candidatos
+        stub: Usar modelos simulados (solo para comprobar el procedimiento)
+        seed: Semilla de los textos sintéticos
+    """
+    def __init__(self, config, quick=False, stub=False, seed=0):
+        self.config = config
+        self.quick = quick
+        self.stub = stub
+        self.repeats = 1 if quick else 3
+        self.vocabulary = make_vocabulary(seed=seed)
+        self.seed = seed
+        self.settings = {}
+        self.trials = []
+
+    def _manager(self, config):
+        return StubModelManager(config) if self.stub else ModelManager(config)
+
+    def _prompt(self, tokens, variant):
+        # Un texto distinto en cada repetición para que llama.cpp no reutilice la caché KV
+        words = make_text(int(tokens * CHARS_PER_TOKEN), seed=self.seed + variant, vocabulary=self.vocabulary)
+        return f"{variant}. {words}"
+
+    def _record(self, stage, settings, result):
+        self.trials.append({"stage": stage, "settings": settings, **result})
+        values = ", ".join(f"{name}={value}" for name, value in settings.items())
+        rates = ", ".join(f"{name}={value:.1f}" for name, value in result.items() if isinstance(value, float))
+        print(f"  [{stage}] {values}: {rates or result.get('error')}")
+
+    def measure_llm(self, stage, prompt_tokens, decode_tokens, **settings):
+        """Carga el LLM con los parámetros indicados y mide prefill y decodificación (tokens/s)"""
+        config = with_settings(self.config, **{**self.settings, **settings})
+        manager = self._manager(config)
+        try:
+            started = time.perf_counter()
+            with quiet():
+                llm = manager.load_model()
+            load_seconds = time.perf_counter() - started
+        except Exception as e:
+            self._record(stage, settings, {"error": str(e)})
+            return None
+
+        prefill_rates = []
+        decode_rates = []
+        for variant in range(self.repeats):
+            llm.reset()
+            prompt = self._prompt(prompt_tokens, variant)
+            tokens = len(llm.tokenize(prompt.encode("utf-8")))
+            start = time.perf_counter()
+            first_token_at = None
+            generated = 0
+            for _ in llm(prompt, max_tokens=decode_tokens, temperature=0.0, stream=True):
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                generated += 1
+            end = time.perf_counter()
+            if first_token_at is None:
+                continue
+            prefill_rates.append(tokens / max(first_token_at - start, 1e-9))
+            if generated > 1:
+                decode_rates.append((generated - 1) / max(end - first_token_at, 1e-9))
+
+        manager.llm = None
+        del llm
+        gc.collect()
+
+        result = {"load_seconds": load_seconds}
+        if prefill_rates:
+            result["prefill_tokens_per_second"] = statistics.median(prefill_rates)
+        if decode_rates:
+            result["decode_tokens_per_second"] = statistics.median(decode_rates)
+        self._record(stage, settings, result)
+        return result
+
+    def _best(self, candidates, key):
+        measured = [(value, result) for value, result in candidates if result and key in result]
+        if not measured:
+            return None, None
+        return max(measured, key=lambda item: item[1][key])
+
+    def tune_llm(self):
+        print("LLM:")
+        # 1. Contexto: el menor que cabe el prompt RAG y que se puede cargar
+        needed = required_context()
+        for n_ctx in [c for c in CONTEXT_CANDIDATES if c >= needed]:
+            if self.measure_llm("n_ctx", 64, 2, N_CTX=n_ctx) is not None:
+                self.settings["N_CTX"] = n_ctx
+                break
+        else:
+            self.settings["N_CTX"] = self.config.N_CTX
+            print(f"  Ningún contexto candidato cargó; se mantiene N_CTX={self.config.N_CTX}")
+
+        # 2. Hilos de decodificación
+        decode_tokens = 16 if self.quick else 48
+        candidates = [
+            (threads, self.measure_llm("n_threads", 64, decode_tokens, N_THREADS=threads, N_THREADS_BATCH=threads))
+            for threads in thread_candidates()
+        ]
+        threads, best = self._best(candidates, "decode_tokens_per_second")
+        self.settings["N_THREADS"] = threads or self.config.N_THREADS
+        decode_rate = best["decode_tokens_per_second"] if best else None
+
+        # 3. Hilos y tamaño de lote del prefill
+        prompt_tokens = min(1024, self.settings["N_CTX"] // 2)
+        candidates = [
+            (threads, self.measure_llm("n_threads_batch", prompt_tokens, 1, N_THREADS_BATCH=threads, N_BATCH=512))
+            for threads in thread_candidates()
+        ]
+        threads_batch, _ = self._best(candidates, "prefill_tokens_per_second")
+        self.settings["N_THREADS_BATCH"] = threads_batch or self.settings["N_THREADS"]
+
+        batches = [b for b in BATCH_CANDIDATES if b <= self.settings["N_CTX"]]
+        if self.quick:
+            batches = [b for b in batches if b in (256, 512)]
+        candidates = [
+            (n_batch, self.measure_llm("n_batch", prompt_tokens, 1, N_BATCH=n_batch))
+            for n_batch in batches
+        ]
+        n_batch, best = self._best(candidates, "prefill_tokens_per_second")
+        self.settings["N_BATCH"] = n_batch or self.config.N_BATCH
+        prefill_rate = best["prefill_tokens_per_second"] if best else None
+
+        # 4. mmap siempre (pesos compartidos entre procesos); mlock si el sistema lo permite
+        self.settings["USE_MMAP"] = True
+        self.settings["USE_MLOCK"] = self._mlock_fits()
+        return {"prefill_tokens_per_second": prefill_rate, "decode_tokens_per_second": decode_rate}
+
+    def _mlock_fits(self):
+        try:
+            import resource
+            soft, _ = resource.getrlimit(resource.RLIMIT_MEMLOCK)
+            model_size = os.path.getsize(self.config.MODEL_PATH)
+        except (ImportError, OSError, AttributeError):
+            return False
+        return soft == resource.RLIM_INFINITY or soft >= model_size
+
+    def tune_embeddings(self):
+        print("Embeddings:")
+        manager = self._manager(self.config)
+        with quiet():
+            model = manager.load_embedding_model()
+        texts = list(make_chunks(64 if self.quick else 256, seed=self.seed))
+        torch = None
+        if not self.stub:
+            import torch
+
+        def measure(stage, threads, batch_size):
+            if torch is not None:
+                torch.set_num_threads(threads)
+            model.encode(texts[:batch_size], batch_size=batch_size)  # calentamiento
+            start = time.perf_counter()
+            model.encode(texts, batch_size=batch_size)
+            result = {"chunks_per_second": len(texts) / (time.perf_counter() - start)}
+            self._record(stage, {"TORCH_THREADS": threads, "EMBEDDING_BATCH_SIZE": batch_size}, result)
+            return result
+
+        candidates = [(threads, measure("torch_threads", threads, 32)) for threads in thread_candidates()]
+        threads, _ = self._best(candidates, "chunks_per_second")
+        candidates = [
+            (batch_size, measure("embedding_batch_size", threads, batch_size))
+            for batch_size in EMBEDDING_BATCH_CANDIDATES
+        ]
+        batch_size, best = self._best(candidates, "chunks_per_second")
+        self.settings["TORCH_THREADS"] = threads
+        self.settings["EMBEDDING_BATCH_SIZE"] = batch_size
+        return {"chunks_per_second": best["chunks_per_second"]}
+
+    def run(self, skip_llm=False, skip_embeddings=False):
+        best = {}
+        if not skip_llm:
+            best["llm"] = self.tune_llm()
+        if not skip_embeddings:
+            best["embeddings"] = self.tune_embeddings()
+        return {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "host": {
+                "platform": platform.platform(),
+                "machine": platform.machine(),
+                "processor": platform.processor(),
+                "cpu_count": os.cpu_count(),
+                "python": platform.python_version()
+            },
+            "model_path": None if self.stub else self.config.MODEL_PATH,
+            "embedding_model": self.config.EMBEDDING_MODEL_PATH,
+            "stub": self.stub,
+            "settings": self.settings,
+            "best": best,
+            "trials": self.trials
+        }
+
+
+def autotune(config, output=None, quick=False, stub=False, skip_llm=False, skip_embeddings=False, seed=0):
+    """
+    Mide esta máquina y guarda el perfil de parámetros
+
+    Returns:
+        El perfil generado
+    """
+    if output is None:
+        # Un perfil con modelos simulados no debe aplicarse al servicio
+        if stub:
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            output = os.path.join(RESULTS_DIR, "autotune_stub.json")
+        else:
+            output = config.TUNING_PROFILE_PATH
+    print(f"Autotune en {os.cpu_count()} CPUs; candidatos de hilos: {thread_candidates()}")
+    profile = Autotuner(config, quick=quick, stub=stub, seed=seed).run(skip_llm, skip_embeddings)
+
+    # Conservar los parámetros de un perfil anterior que esta ejecución no midió
+    if os.path.exists(output):
+        try:
+            with open(output, 'r', encoding='utf-8') as f:
+                previous = json.load(f).get("settings", {})
+            profile["settings"] = {**previous, **profile["settings"]}
+        except (OSError, ValueError):
+            pass
+
+    with open(output + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(profile, f, indent=2)
+    os.replace(output + ".tmp", output)
+
+    print("\nParámetros elegidos:")
+    for name, value in profile["settings"].items():
+        print(f"  {name} = {value}")
+    for component, rates in profile["best"].items():
+        print(f"  {component}: " + ", ".join(f"{k}={v:.1f}" for k, v in rates.items() if v is not None))
+    print(f"Perfil guardado en {output}; Config lo aplicará al arrancar")
+    return profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ajuste automático de parámetros para esta máquina")
+    parser.add_argument("--output", type=str, help="Archivo del perfil (default: Config.TUNING_PROFILE_PATH)")
+    parser.add_argument("--quick", action="store_true", help="Menos repeticiones y candidatos")
+    parser.add_argument("--stub", action="store_true", help="Usar modelos simulados (comprobación del procedimiento)")
+    parser.add_argument("--skip_llm", action="store_true", help="No ajustar el LLM")
+    parser.add_argument("--skip_embeddings", action="store_true", help="No ajustar los embeddings")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    autotune(
+        Config(), output=args.output, quick=args.quick, stub=args.stub,
+        skip_llm=args.skip_llm, skip_embeddings=args.skip_embeddings, seed=args.seed
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+# loadgen.py
+"""
+Generador de carga con una mezcla configurable de peticiones
+
+Uso (desde la raíz del proyecto):
+    # Lanza FlaskService localmente con modelos simulados y 16 clientes en bucle cerrado
+    python -m benchmarks.loadgen --launch stub --concurrency 16 --duration 60
+
+    # Tasa de llegada fija (bucle abierto) contra un servidor ya en marcha
+    python -m benchmarks.loadgen --url http://localhost:5000 --rate 20 --duration 120
+
+    # Mezcla de peticiones personalizada (pesos relativos)
+    python -m benchmarks.loadgen --launch stub --mix query-simple=60,vector-search=35,pdf-upload=5
+
+En bucle cerrado (--concurrency) cada cliente envía una petición en cuanto recibe
+la respuesta anterior. En bucle abierto (--rate) las peticiones llegan según un
+proceso de Poisson independientemente de lo que tarde el servidor, lo que muestra
+cómo crecen las colas cuando se supera la capacidad. La latencia se mide desde la
+llegada programada, incluida la espera en el cliente si se alcanza --max_in_flight.
+
+Se informa del rendimiento, la tasa de errores y los percentiles p50/p95/p99 por
+endpoint en cada intervalo y en total, y se guarda todo en JSON.
+"""
+import argparse
+import base64
+import http.client
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import numpy as np
+
+from benchmarks.synthetic import make_pdf, make_chunks, make_vocabulary
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+ENDPOINTS = {
+    "query-simple": "/api/query-simple",
+    "query-pdf": "/api/query-pdf",
+    "vector-search": "/api/vector/search",
+    "pdf-upload": "/api/pdf/upload"
+}
+
+
+def parse_mix(mix):
+    """'query-simple=70,vector-search=25' -> [(nombre, peso), ...]"""
+    weights = []
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Endpoint desconocido en la mezcla: {name} (opciones: {', '.join(ENDPOINTS)})")
+        weights.append((name, float(weight or 1)))
+    return weights
+
+
+class RequestFactory:
+    """Construye los cuerpos de las peticiones de forma determinista a partir de una semilla"""
+    def __init__(self, seed, max_tokens, top_k, pdf_pages):
+        self.vocabulary = make_vocabulary(seed=seed)
+        self.max_tokens = max_tokens
+        self.top_k = top_k
+        pdf_path = make_pdf(os.path.join(tempfile.mkdtemp(prefix="loadgen-"), "loadgen.pdf"), pdf_pages, seed=seed)
+        with open(pdf_path, "rb") as f:
+            self.pdf_data = base64.b64encode(f.read()).decode("ascii")
+        os.remove(pdf_path)
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def body(self, name, rng):
+        query = " ".join(rng.choices(self.vocabulary, k=8))
+        if name == "query-simple":
+            return {"query": query, "max_tokens": self.max_tokens}
+        if name == "query-pdf":
+            return {"query": query, "top_k": self.top_k, "max_tokens": self.max_tokens}
+        if name == "vector-search":
+            return {"query": query, "top_k": self.top_k}
+        with self._lock:
+            self._counter += 1
+            number = self._counter
+        return {"pdf_data": self.pdf_data, "filename": f"loadgen_{number}.pdf"}
+
+
+class HttpClient:
+    """Conexión HTTP keep-alive por hilo"""
+    def __init__(self, base_url, timeout):
+        parsed = urlparse(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def post(self, path, body):
+        payload = json.dumps(body).encode("utf-8")
+        while True:
+            connection = getattr(self._local, "connection", None)
+            fresh = connection is None
+            if fresh:
+                connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                self._local.connection = connection
+            try:
+                connection.request("POST", path, body=payload, headers={"Content-Type": "application/json"})
+                response = connection.getresponse()
+                response.read()
+                return response.status
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                connection.close()
+                self._local.connection = None
+                # Solo se reintenta si el servidor cerró una conexión keep-alive
+                # reutilizada antes de responder; nunca tras un timeout
+                if fresh:
+                    raise
+            except Exception:
+                connection.close()
+                self._local.connection = None
+                raise
+
+
+class LoadGenerator:
+    def __init__(self, client, factory, mix, seed):
+        self.client = client
+        self.factory = factory
+        self.names = [name for name, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.seed = seed
+        self.records = []  # (inicio relativo, endpoint, latencia, status o None si hubo excepción)
+        self._records_lock = threading.Lock()
+        self.started_at = None
+
+    def _send(self, rng, scheduled_at=None):
+        name = rng.choices(self.names, weights=self.weights)[0]
+        body = self.factory.body(name, rng)
+        # En bucle abierto la latencia se mide desde la llegada programada, así
+        # que incluye la espera en el cliente cuando max_in_flight está saturado
+        start = scheduled_at if scheduled_at is not None else time.perf_counter()
+        try:
+            status = self.client.post(ENDPOINTS[name], body)
+        except Exception:
+            status = None
+        latency = time.perf_counter() - start
+        with self._records_lock:
+            self.records.append((start - self.started_at, name, latency, status))
+
+    def run_closed_loop(self, concurrency, duration):
+        self.started_at = time.perf_counter()
+        deadline = self.started_at + duration
+
+        def worker(worker_id):
+            rng = random.Random(self.seed * 1000 + worker_id)
+            while time.perf_counter() < deadline:
+                self._send(rng)
+
+        threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def run_open_loop(self, rate, duration, max_in_flight):
+        rng = random.Random(self.seed)
+        self.started_at = time.perf_counter()
+        deadline = self.started_at + duration
+        next_arrival = self.started_at
+        with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+            while True:
+                next_arrival += rng.expovariate(rate)
+                if next_arrival >= deadline:
+                    break
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self._send, random.Random(rng.random()), next_arrival)
+
+
+def summarize(records, duration):
+    """Rendimiento, tasa de errores y percentiles de una lista de registros"""
+    if not records:
+        return {"requests": 0, "throughput_rps": 0.0, "error_rate": 0.0}
+    latencies = np.array([latency for _, _, latency, _ in records]) * 1000.0
+    errors = sum(1 for _, _, _, status in records if status is None or status >= 400)
+    return {
+        "requests": len(records),
+        "throughput_rps": len(records) / duration if duration > 0 else 0.0,
+        "error_rate": errors / len(records),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "max_ms": float(latencies.max())
+    }
+
+
+def build_report(records, duration, interval):
+    by_endpoint = {}
+    for record in records:
+        by_endpoint.setdefault(record[1], []).append(record)
+
+    timeline = []
+    for window_start in np.arange(0, duration, interval):
+        window_end = min(window_start + interval, duration)
+        window = [r for r in records if window_start <= r[0] < window_end]
+        window_by_endpoint = {}
+        for record in window:
+            window_by_endpoint.setdefault(record[1], []).append(record)
+        timeline.append({
+            "start_s": float(window_start),
+            "end_s": float(window_end),
+            "total": summarize(window, window_end - window_start),
+            "endpoints": {
+                name: summarize(items, window_end - window_start)
+                for name, items in sorted(window_by_endpoint.items())
+            }
+        })
+
+    return {
+        "total": summarize(records, duration),
+        "endpoints": {name: summarize(items, duration) for name, items in sorted(by_endpoint.items())},
+        "timeline": timeline
+    }
+
+
+def print_summary(name, summary):
+    if not summary["requests"]:
+        print(f"  {name:<15} sin peticiones")
+        return
+    print(
+        f"  {name:<15} {summary['requests']:>7} pet. {summary['throughput_rps']:>8.1f} pet/s "
+        f"errores {summary['error_rate'] * 100:>5.1f}%  p50 {summary['p50_ms']:>8.1f} ms  "
+        f"p95 {summary['p95_ms']:>8.1f} ms  p99 {summary['p99_ms']:>8.1f} ms"
+    )
+
+
+def launch_local_service(args):
+    """Arranca FlaskService en un hilo con un puerto libre y devuelve su URL"""
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    from Entrenamiento.config import Config
+    from Entrenamiento.vector_database import VectorDatabase
+    from Entrenamiento.app import FlaskService
+
+    work_dir = tempfile.mkdtemp(prefix="loadgen-db-")
+    config = Config()
+    config.VECTOR_DB_PATH = os.path.join(work_dir, "vector_database")
+    config.UPLOAD_DIR = os.path.join(work_dir, "uploads")
+
+    if args.launch == "stub":
+        from Entrenamiento.stub_models import StubModelManager
+
+        model_manager = StubModelManager(
+            config,
+            prefill_seconds_per_token=args.stub_prefill_ms / 1000.0,
+            decode_seconds_per_token=args.stub_decode_ms / 1000.0
+        )
+    else:
+        from Entrenamiento.model_manager import ModelManager
+
+        model_manager = ModelManager(config)
+    model_manager.load_embedding_model()
+    model_manager.load_model()
+
+    vector_db = VectorDatabase(config)
+    print(f"Precargando {args.seed_chunks} fragmentos sintéticos...")
+    vector_db.add_documents([
+        (text, model_manager.generate_embeddings(text),
+         {"source": f"synthetic_{i // 100}.pdf", "type": "pdf", "chunk_id": i})
+        for i, text in enumerate(make_chunks(args.seed_chunks, seed=args.seed))
+    ])
+    vector_db.save()
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    service = FlaskService(model_manager, vector_db, config)
+    server = make_server("127.0.0.1", 0, service.app, threaded=True, request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generador de carga para el servicio RAG")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", type=str, help="URL de un servidor ya en marcha")
+    target.add_argument("--launch", choices=["stub", "real"], help="Lanzar FlaskService localmente con modelos simulados o reales")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--concurrency", type=int, help="Clientes en bucle cerrado (default: 8)")
+    mode.add_argument("--rate", type=float, help="Peticiones por segundo en bucle abierto")
+    parser.add_argument("--max_in_flight", type=int, default=256, help="Máximo de peticiones simultáneas en bucle abierto")
+    parser.add_argument("--mix", type=str, default="query-simple=70,vector-search=25,pdf-upload=5",
+                        help="Mezcla de endpoints con pesos relativos")
+    parser.add_argument("--duration", type=float, default=30.0, help="Duración de la prueba en segundos")
+    parser.add_argument("--interval", type=float, default=5.0, help="Segundos por intervalo del informe temporal")
+    parser.add_argument("--max_tokens", type=int, default=64, help="max_tokens de las consultas")
+    parser.add_argument("--top_k", type=int, default=5, help="top_k de las búsquedas")
+    parser.add_argument("--pdf_pages", type=int, default=5, help="Páginas del PDF sintético de las subidas")
+    parser.add_argument("--seed_chunks", type=int, default=5000, help="Fragmentos precargados con --launch")
+    parser.add_argument("--stub_prefill_ms", type=float, default=0.05, help="Retardo simulado por token de prompt (ms)")
+    parser.add_argument("--stub_decode_ms", type=float, default=2.0, help="Retardo simulado por token generado (ms)")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Timeout de cada petición en segundos")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla de las peticiones")
+    parser.add_argument("--output", type=str, help="Archivo JSON de resultados (default: benchmarks/results/load-<fecha>.json)")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    base_url = args.url or launch_local_service(args)
+    generator = LoadGenerator(
+        HttpClient(base_url, args.timeout),
+        RequestFactory(args.seed, args.max_tokens, args.top_k, args.pdf_pages),
+        mix,
+        args.seed
+    )
+
+    if args.rate:
+        print(f"Bucle abierto a {args.rate} pet/s durante {args.duration}s contra {base_url}")
+        generator.run_open_loop(args.rate, args.duration, args.max_in_flight)
+    else:
+        concurrency = args.concurrency or 8
+        print(f"Bucle cerrado con {concurrency} clientes durante {args.duration}s contra {base_url}")
+        generator.run_closed_loop(concurrency, args.duration)
+
+    elapsed = time.perf_counter() - generator.started_at
+    report = build_report(generator.records, elapsed, args.interval)
+
+    for window in report["timeline"]:
+        print(f"[{window['start_s']:>6.1f}s - {window['end_s']:>6.1f}s]")
+        for name, summary in window["endpoints"].items():
+            print_summary(name, summary)
+    print("Total:")
+    for name, summary in report["endpoints"].items():
+        print_summary(name, summary)
+    print_summary("todos", report["total"])
+
+    report["meta"] = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "target": base_url,
+        "arguments": vars(args)
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Resultados guardados en {output}")
+
+
+if __name__ == "__main__":
+    main()
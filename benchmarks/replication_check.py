@@ -0,0 +1,267 @@
+# replication_check.py
+"""
+Comprobación de la replicación con dos procesos locales (primario y réplica)
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.replication_check                    # directorio compartido
+    python -m benchmarks.replication_check --transport http   # la réplica sigue al primario por HTTP
+
+Lanza un primario y una réplica como procesos separados, con modelos simulados
+y bases de datos en un directorio temporal. A través de la API del primario
+añade documentos, elimina una fuente y limpia la base de datos; tras cada paso
+espera a que la réplica aplique la versión publicada y compara sus búsquedas
+con las del primario. También comprueba que la réplica rechaza las escrituras
+y expone sus métricas de replicación. Termina con código 1 si algo falla.
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+QUERIES = ["configuración del servidor", "rendimiento del índice", "documento de prueba"]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def request_json(url, body=None, timeout=30):
+    """(código HTTP, JSON de la respuesta) de un GET o, con body, un POST"""
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            return response.status, json.loads(response.read() or b"null")
+    except urllib.error.HTTPError as e:
+        payload = e.read()
+        try:
+            return e.code, json.loads(payload)
+        except ValueError:
+            return e.code, None
+
+
+def make_config(work_dir, name):
+    from Entrenamiento.config import Config
+
+    config = Config()
+    config.VECTOR_DB_PATH = os.path.join(work_dir, name, "vector_database")
+    config.UPLOAD_DIR = os.path.join(work_dir, name, "uploads")
+    config.SUMMARIES_ENABLED = False
+    return config
+
+
+def serve(service, port):
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server("127.0.0.1", port, service.app, threaded=True, request_handler=QuietRequestHandler)
+    server.serve_forever()
+
+
+def run_primary(args):
+    from Entrenamiento.stub_models import StubModelManager
+    from Entrenamiento.vector_database import VectorDatabase
+    from Entrenamiento.app import FlaskService
+
+    config = make_config(args.work_dir, "primary")
+    config.REPLICATION_DIR = os.path.join(args.work_dir, "replication")
+    # Instantáneas frecuentes para que la prueba también las purgue
+    config.REPLICATION_SNAPSHOT_EVERY = 3
+    model_manager = StubModelManager(config)
+    model_manager.load_embedding_model()
+    model_manager.load_model()
+    serve(FlaskService(model_manager, VectorDatabase(config), config), args.port)
+
+
+def run_replica(args):
+    from Entrenamiento.stub_models import StubModelManager
+    from Entrenamiento.vector_database import VectorDatabase
+    from Entrenamiento.replication import Replica
+    from Entrenamiento.app import FlaskService
+
+    config = make_config(args.work_dir, "replica")
+    model_manager = StubModelManager(config)
+    model_manager.load_embedding_model()
+    model_manager.load_model()
+    vector_db = VectorDatabase(config, autoload=False, read_only=True)
+    replica = Replica(args.source, vector_db, poll_interval=0.2)
+    replica.bootstrap()
+    replica.start()
+    serve(FlaskService(model_manager, vector_db, config, replica=replica), args.port)
+
+
+class ReplicationCheck:
+    """Lanza los dos procesos y ejecuta los pasos de la comprobación"""
+    def __init__(self, transport, work_dir, timeout):
+        self.transport = transport
+        self.work_dir = work_dir
+        self.timeout = timeout
+        self.primary_url = f"http://127.0.0.1:{free_port()}"
+        self.replica_url = f"http://127.0.0.1:{free_port()}"
+        self.processes = []
+        self.failures = 0
+
+    def _spawn(self, role, url, extra=()):
+        log = open(os.path.join(self.work_dir, f"{role}.log"), "w")
+        command = [
+            sys.executable, "-m", "benchmarks.replication_check", "--role", role,
+            "--work_dir", self.work_dir, "--port", url.rsplit(":", 1)[1], *extra
+        ]
+        process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)
+        self.processes.append(process)
+        self._wait_until(lambda: self._healthy(url), f"el proceso {role} no arrancó (ver {log.name})")
+
+    def _healthy(self, url):
+        try:
+            return request_json(url + "/api/health", timeout=2)[0] == 200
+        except OSError:
+            return False
+
+    def _wait_until(self, condition, message):
+        deadline = time.time() + self.timeout
+        while time.time() < deadline:
+            if condition():
+                return
+            if any(process.poll() is not None for process in self.processes):
+                raise RuntimeError(f"Un proceso terminó antes de tiempo: {message}")
+            time.sleep(0.1)
+        raise RuntimeError(message)
+
+    def start(self):
+        self._spawn("primary", self.primary_url)
+        source = self.primary_url if self.transport == "http" else os.path.join(self.work_dir, "replication")
+        self._spawn("replica", self.replica_url, ("--source", source))
+
+    def stop(self):
+        for process in self.processes:
+            if process.poll() is None:
+                process.terminate()
+                process.wait(timeout=10)
+
+    def check(self, name, ok, detail=""):
+        print(f"  [{'OK' if ok else 'FALLO'}] {name}" + (f": {detail}" if detail and not ok else ""))
+        if not ok:
+            self.failures += 1
+
+    def _primary_version(self):
+        with open(os.path.join(self.work_dir, "replication", "head.json"), "r", encoding="utf-8") as f:
+            return json.load(f)["version"]
+
+    def _replica_status(self):
+        return request_json(self.replica_url + "/api/health")[1]["replication"]
+
+    def sync_and_compare(self, step):
+        """Espera a que la réplica alcance la versión del primario y compara ambos"""
+        version = self._primary_version()
+        self._wait_until(
+            lambda: self._replica_status()["applied_version"] == version,
+            f"la réplica no alcanzó la v{version} tras {step}"
+        )
+        primary_count = request_json(self.primary_url + "/api/health")[1]["documents_count"]
+        replica_count = request_json(self.replica_url + "/api/health")[1]["documents_count"]
+        self.check(f"{step}: réplica en v{version} con {replica_count} documentos", primary_count == replica_count,
+                   f"el primario tiene {primary_count}")
+
+        for query in QUERIES:
+            body = {"query": query, "top_k": 3}
+            primary = request_json(self.primary_url + "/api/vector/search", body)[1]["results"]
+            replica = request_json(self.replica_url + "/api/vector/search", body)[1]["results"]
+            same = [(r["id"], r["text"]) for r in primary] == [(r["id"], r["text"]) for r in replica]
+            self.check(f"{step}: búsqueda '{query}' igual en ambos", same)
+
+    def add(self, count, source, offset=0):
+        for i in range(offset, offset + count):
+            status, _ = request_json(self.primary_url + "/api/vector/add", {
+                "text": f"Documento de prueba {i} de {source}: configuración del servidor y rendimiento del índice {i * 7}",
+                "metadata": {"source": source}
+            })
+            if status != 200:
+                raise RuntimeError(f"El primario rechazó el alta de un documento ({status})")
+
+    def run(self):
+        self.start()
+        print(f"Primario en {self.primary_url}, réplica en {self.replica_url} ({self.transport})")
+
+        self.add(4, "a.pdf")
+        self.add(3, "b.pdf")
+        self.sync_and_compare("altas")
+
+        status, _ = request_json(self.primary_url + "/api/data/clear-pdf", {"pdf_name": "a.pdf"})
+        self.check("eliminar a.pdf en el primario", status == 200)
+        self.sync_and_compare("eliminar fuente")
+
+        status, _ = request_json(self.replica_url + "/api/vector/add", {"text": "no permitido"})
+        self.check("la réplica rechaza escrituras con 403", status == 403, f"código {status}")
+
+        status, _ = request_json(self.primary_url + "/api/data/clear", {"confirm": True})
+        self.check("limpiar el primario", status == 200)
+        self.sync_and_compare("limpieza")
+
+        self.add(5, "c.pdf", offset=100)
+        self.sync_and_compare("altas tras la limpieza")
+
+        with urllib.request.urlopen(self.replica_url + "/api/metrics", timeout=30) as response:
+            metrics_text = response.read().decode("utf-8")
+        self.check(
+            "métricas de replicación en /api/metrics",
+            "rag_replication_versions_behind 0.0" in metrics_text,
+            "no aparece rag_replication_versions_behind 0.0"
+        )
+
+        status = self._replica_status()
+        print(f"Réplica: {status['deltas_applied']} deltas aplicados, {status['bootstraps']} cargas de instantánea")
+        return self.failures == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comprobación de la replicación con un primario y una réplica locales")
+    parser.add_argument("--transport", choices=["dir", "http"], default="dir",
+                        help="La réplica lee el directorio de exportación o los endpoints HTTP del primario")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Segundos máximos de espera por paso")
+    parser.add_argument("--keep", action="store_true", help="Conservar el directorio temporal con las bases de datos y los logs")
+    # Uso interno: procesos hijos
+    parser.add_argument("--role", choices=["primary", "replica"], help=argparse.SUPPRESS)
+    parser.add_argument("--work_dir", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--source", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.role == "primary":
+        run_primary(args)
+        return
+    if args.role == "replica":
+        run_replica(args)
+        return
+
+    work_dir = tempfile.mkdtemp(prefix="replication-check-")
+    check = ReplicationCheck(args.transport, work_dir, args.timeout)
+    try:
+        ok = check.run()
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        ok = False
+    finally:
+        check.stop()
+
+    if args.keep or not ok:
+        print(f"Bases de datos y logs en {work_dir}")
+    else:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print("Replicación correcta" if ok else "La comprobación de la replicación falló")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
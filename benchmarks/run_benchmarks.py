@@ -0,0 +1,317 @@
+# run_benchmarks.py
+"""
+Benchmarks reproducibles de ingesta, recuperación y latencia RAG (sin conexión)
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.run_benchmarks --sizes 10000 100000 1000000
+    python -m benchmarks.run_benchmarks --baseline benchmarks/results/anterior.json
+
+Mide:
+    - Extracción de PDFs (páginas/s) con PDFs sintéticos
+    - Fragmentación con chunk_text (MB/s)
+    - Embeddings (fragmentos/s)
+    - Construcción del índice (s) y guardado en disco (s) para cada tamaño
+    - Búsqueda p50/p99 para varios top_k
+    - Latencia de extremo a extremo a través de FlaskService con un LLM simulado
+
+Por defecto se usan modelos simulados deterministas (Entrenamiento.stub_models),
+así que los resultados dependen solo del código y de la máquina. Los resultados
+se escriben en JSON para comparar ejecuciones.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+from Entrenamiento.config import Config
+from Entrenamiento.pdf_utils import extract_pages_from_pdf, chunk_text
+from Entrenamiento.vector_database import VectorDatabase
+from Entrenamiento.stub_models import StubModelManager
+from benchmarks.synthetic import make_pdf, make_text, make_chunks, make_vocabulary
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def percentiles(samples):
+    """Resumen de latencias en milisegundos"""
+    values = np.array(samples) * 1000.0
+    return {
+        "count": len(samples),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p90_ms": float(np.percentile(values, 90)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max())
+    }
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silencia los print y barras de progreso del código medido"""
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        yield
+
+
+def make_model_manager(config, embedder):
+    if embedder == "real":
+        from Entrenamiento.model_manager import ModelManager
+
+        model_manager = ModelManager(config)
+        model_manager.load_embedding_model()
+        # El LLM real no se usa: la latencia de extremo a extremo mide el resto del camino
+        stub = StubModelManager(config)
+        model_manager.llm = stub.load_model()
+        return model_manager
+
+    model_manager = StubModelManager(config)
+    model_manager.load_embedding_model()
+    model_manager.load_model()
+    return model_manager
+
+
+def bench_extraction(work_dir, pages, seed):
+    pdf_path = make_pdf(os.path.join(work_dir, "synthetic.pdf"), pages, seed=seed)
+    with quiet():
+        start = time.perf_counter()
+        extracted = extract_pages_from_pdf(pdf_path)
+        elapsed = time.perf_counter() - start
+    return {
+        "pages": len(extracted),
+        "pdf_bytes": os.path.getsize(pdf_path),
+        "seconds": elapsed,
+        "pages_per_second": len(extracted) / elapsed
+    }
+
+
+def bench_chunking(megabytes, chunk_size, chunk_overlap, seed):
+    text = make_text(int(megabytes * 1024 * 1024), seed=seed)
+    with quiet():
+        start = time.perf_counter()
+        chunks = chunk_text(text, chunk_size, chunk_overlap)
+        elapsed = time.perf_counter() - start
+    size_mb = len(text.encode("utf-8")) / (1024 * 1024)
+    return {
+        "megabytes": size_mb,
+        "chunks": len(chunks),
+        "seconds": elapsed,
+        "megabytes_per_second": size_mb / elapsed
+    }
+
+
+def bench_embedding(model_manager, texts):
+    # Mismo camino que la ingesta de PDFs: lotes de EMBEDDING_BATCH_SIZE
+    start = time.perf_counter()
+    embeddings = model_manager.generate_embeddings_batch(texts)
+    elapsed = time.perf_counter() - start
+    return embeddings, {
+        "chunks": len(texts),
+        "batch_size": model_manager.config.EMBEDDING_BATCH_SIZE,
+        "seconds": elapsed,
+        "chunks_per_second": len(texts) / elapsed
+    }
+
+
+def bench_index(config, model_manager, size, chunk_size, embedding_sample, seed):
+    """Construye una base de datos de `size` fragmentos y mide embeddings, añadido y guardado"""
+    texts = list(make_chunks(size, chunk_size, seed=seed))
+
+    # Con el modelo real solo se mide una muestra; el resto usa embeddings simulados
+    sample = texts[:embedding_sample]
+    sample_embeddings, embedding_result = bench_embedding(model_manager, sample)
+    if len(sample) < len(texts):
+        stub = StubModelManager(config)
+        stub.load_embedding_model()
+        rest = stub.generate_embeddings_batch(texts[len(sample):])
+        embeddings = sample_embeddings + rest
+    else:
+        embeddings = sample_embeddings
+
+    with quiet():
+        vector_db = VectorDatabase(config)
+        start = time.perf_counter()
+        vector_db.add_documents([
+            (text, embedding, {"source": f"synthetic_{i // 100}.pdf", "type": "pdf", "chunk_id": i})
+            for i, (text, embedding) in enumerate(zip(texts, embeddings))
+        ])
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        vector_db.save()
+        save_seconds = time.perf_counter() - start
+
+    return vector_db, {
+        "chunks": size,
+        "embedding": embedding_result,
+        "build_seconds": build_seconds,
+        "chunks_per_second": size / build_seconds,
+        "save_seconds": save_seconds
+    }
+
+
+def bench_search(model_manager, vector_db, top_ks, queries, seed):
+    vocabulary = make_vocabulary(seed=seed)
+    rng = np.random.default_rng(seed)
+    query_texts = [" ".join(rng.choice(vocabulary, size=8)) for _ in range(queries)]
+    query_embeddings = [model_manager.generate_embeddings(q) for q in query_texts]
+
+    results = {}
+    for top_k in top_ks:
+        samples = []
+        for embedding in query_embeddings:
+            start = time.perf_counter()
+            vector_db.search(embedding, top_k)
+            samples.append(time.perf_counter() - start)
+        results[str(top_k)] = percentiles(samples)
+    return results
+
+
+def bench_end_to_end(config, model_manager, vector_db, requests, max_tokens, seed):
+    from Entrenamiento.app import FlaskService
+
+    service = FlaskService(model_manager, vector_db, config)
+    client = service.app.test_client()
+    vocabulary = make_vocabulary(seed=seed)
+    rng = np.random.default_rng(seed)
+
+    endpoints = {
+        "/api/vector/search": lambda q: {"query": q, "top_k": 5},
+        "/api/query-simple": lambda q: {"query": q, "max_tokens": max_tokens},
+        "/api/query-pdf": lambda q: {"query": q, "top_k": 5, "max_tokens": max_tokens}
+    }
+    results = {}
+    for endpoint, make_body in endpoints.items():
+        samples = []
+        for _ in range(requests):
+            body = make_body(" ".join(rng.choice(vocabulary, size=8)))
+            start = time.perf_counter()
+            response = client.post(endpoint, json=body)
+            samples.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise RuntimeError(f"{endpoint} devolvió {response.status_code}: {response.get_data(as_text=True)}")
+        results[endpoint] = percentiles(samples)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def compare(current, baseline, path=""):
+    """Imprime la variación relativa de cada valor numérico respecto a una ejecución anterior"""
+    for key, value in current.items():
+        name = f"{path}.{key}" if path else key
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        if isinstance(value, dict):
+            compare(value, old or {}, name)
+        elif isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+            change = (value - old) / old * 100.0
+            print(f"  {name}: {old:.4g} -> {value:.4g} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de ingesta, recuperación y latencia RAG")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000],
+                        help="Tamaños del corpus en fragmentos (p. ej. 10000 100000 1000000)")
+    parser.add_argument("--top_k", type=int, nargs="+", default=[1, 5, 10, 50], help="Valores de top_k para la búsqueda")
+    parser.add_argument("--queries", type=int, default=200, help="Consultas por cada top_k")
+    parser.add_argument("--pdf_pages", type=int, default=50, help="Páginas del PDF sintético")
+    parser.add_argument("--chunking_mb", type=float, default=5.0, help="Megabytes de texto para chunk_text")
+    parser.add_argument("--chunk_size", type=int, default=1000, help="Tamaño de cada fragmento")
+    parser.add_argument("--chunk_overlap", type=int, default=200, help="Superposición entre fragmentos")
+    parser.add_argument("--embedder", choices=["stub", "real"], default="stub",
+                        help="Modelo de embeddings: simulado (sin conexión) o el configurado en Config")
+    parser.add_argument("--embedding_sample", type=int, default=2000,
+                        help="Fragmentos embebidos con el modelo elegido por tamaño (el resto, simulados)")
+    parser.add_argument("--e2e_requests", type=int, default=100, help="Peticiones por endpoint en la prueba de extremo a extremo")
+    parser.add_argument("--max_tokens", type=int, default=32, help="Tokens generados por el LLM simulado")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla de los datos sintéticos")
+    parser.add_argument("--output", type=str, help="Archivo JSON de resultados (default: benchmarks/results/bench-<fecha>.json)")
+    parser.add_argument("--baseline", type=str, help="JSON de una ejecución anterior con el que comparar")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="rag-bench-")
+    config = Config()
+    config.UPLOAD_DIR = os.path.join(work_dir, "uploads")
+    model_manager = make_model_manager(config, args.embedder)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "arguments": vars(args)
+        },
+        "results": {}
+    }
+    results = report["results"]
+
+    try:
+        print(f"Extracción de PDF ({args.pdf_pages} páginas)...")
+        results["extraction"] = bench_extraction(work_dir, args.pdf_pages, args.seed)
+        print(f"  {results['extraction']['pages_per_second']:.1f} páginas/s")
+
+        print(f"Fragmentación ({args.chunking_mb} MB)...")
+        results["chunking"] = bench_chunking(args.chunking_mb, args.chunk_size, args.chunk_overlap, args.seed)
+        print(f"  {results['chunking']['megabytes_per_second']:.2f} MB/s")
+
+        results["corpus"] = {}
+        for size in args.sizes:
+            print(f"Corpus de {size} fragmentos...")
+            config.VECTOR_DB_PATH = os.path.join(work_dir, f"db_{size}")
+            vector_db, index_result = bench_index(
+                config, model_manager, size, args.chunk_size, args.embedding_sample, args.seed
+            )
+            print(f"  Embeddings: {index_result['embedding']['chunks_per_second']:.1f} fragmentos/s")
+            print(f"  Índice construido en {index_result['build_seconds']:.2f}s, guardado en {index_result['save_seconds']:.2f}s")
+
+            search_result = bench_search(model_manager, vector_db, args.top_k, args.queries, args.seed)
+            for top_k, summary in search_result.items():
+                print(f"  Búsqueda top_k={top_k}: p50 {summary['p50_ms']:.3f} ms, p99 {summary['p99_ms']:.3f} ms")
+
+            with quiet():
+                e2e_result = bench_end_to_end(
+                    config, model_manager, vector_db, args.e2e_requests, args.max_tokens, args.seed
+                )
+            for endpoint, summary in e2e_result.items():
+                print(f"  {endpoint}: p50 {summary['p50_ms']:.2f} ms, p99 {summary['p99_ms']:.2f} ms")
+
+            results["corpus"][str(size)] = {
+                "index": index_result,
+                "search": search_result,
+                "end_to_end": e2e_result
+            }
+            del vector_db
+            shutil.rmtree(config.VECTOR_DB_PATH, ignore_errors=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Resultados guardados en {output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"Comparación con {args.baseline}:")
+        compare(results, baseline.get("results", {}))
+
+
+if __name__ == "__main__":
+    main()
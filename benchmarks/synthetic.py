@@ -0,0 +1,94 @@
+# synthetic.py
+"""
+Generadores deterministas de PDFs y textos sintéticos para los benchmarks
+"""
+import random
+
+_SYLLABLES = ("ca", "de", "li", "mo", "ra", "ne", "to", "su", "pe", "ba", "ri", "lo", "ma", "ti", "con", "es", "ser", "al")
+
+
+def make_vocabulary(size=5000, seed=0):
+    """Vocabulario de palabras inventadas de 2 a 4 sílabas"""
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def make_text(num_chars, seed=0, vocabulary=None):
+    """Texto sintético de aproximadamente num_chars caracteres, con párrafos"""
+    rng = random.Random(seed)
+    vocabulary = vocabulary or make_vocabulary(seed=seed)
+    parts = []
+    length = 0
+    while length < num_chars:
+        words = rng.choices(vocabulary, k=rng.randint(6, 18))
+        sentence = " ".join(words).capitalize() + "."
+        if rng.random() < 0.1:
+            sentence += "\n\n"
+        parts.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(parts)
+
+
+def make_chunks(count, chunk_chars=1000, seed=0):
+    """Genera count fragmentos de texto de unos chunk_chars caracteres"""
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(seed=seed)
+    words_per_chunk = max(1, chunk_chars // 8)
+    for _ in range(count):
+        yield " ".join(rng.choices(vocabulary, k=words_per_chunk))
+
+
+def _escape_pdf_text(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(path, num_pages, lines_per_page=40, seed=0):
+    """
+    Escribe un PDF válido con texto sintético (fuente Helvetica, sin dependencias)
+
+    Returns:
+        Ruta del PDF generado
+    """
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(seed=seed)
+
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Árbol de páginas, se completa al final
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    ]
+    page_refs = []
+    for _ in range(num_pages):
+        lines = [" ".join(rng.choices(vocabulary, k=12)) for _ in range(lines_per_page)]
+        content = "BT /F1 10 Tf 12 TL 50 780 Td " + " ".join(
+            f"({_escape_pdf_text(line)}) Tj T*" for line in lines
+        ) + " ET"
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+        content_ref = len(objects)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_ref} 0 R >>"
+        )
+        page_refs.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(page_refs)}] /Count {num_pages} >>"
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        output += f"{offset:010d} 00000 n \n".encode("latin-1")
+    output += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref_offset}\n%%EOF\n"
+    ).encode("latin-1")
+
+    with open(path, "wb") as f:
+        f.write(output)
+    return path
@@ -4,9 +4,11 @@ Script principal actualizado con soporte para PDFs
 """
 import argparse
 import os
+import time
 from Entrenamiento.pdf_utils import load_pdf_to_db
 
 def main():
+    started_at = time.time()
     parser = argparse.ArgumentParser(description="API de servicio LLM con base de datos vectorial")
     parser.add_argument("--serve", action="store_true", help="Iniciar el servidor API")
     parser.add_argument("--port", type=int, default=5000, help="Puerto para el servidor (default: 5000)")
@@ -15,6 +17,18 @@ def main():
     parser.add_argument("--chunk_size", type=int, default=1000, help="Tamaño de cada fragmento (en caracteres)")
     parser.add_argument("--chunk_overlap", type=int, default=200, help="Superposición entre fragmentos")
     parser.add_argument("--no_debug", action="store_true", help="Desactivar modo debug de Flask")
+    parser.add_argument("--fast_start", action="store_true",
+                        help="Iniciar el servidor de inmediato y cargar modelos e índice en segundo plano")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Servir en producción con N procesos worker (gunicorn) y un proceso escritor")
+    parser.add_argument("--autotune", action="store_true",
+                        help="Medir esta máquina y guardar los parámetros óptimos del LLM y de embeddings")
+    parser.add_argument("--autotune_quick", action="store_true",
+                        help="Autotune con menos repeticiones y candidatos")
+    parser.add_argument("--replication_dir", type=str,
+                        help="Exportar instantáneas y deltas en este directorio para réplicas")
+    parser.add_argument("--replica-of", "--replica_of", dest="replica_of", type=str,
+                        help="Servir como réplica de solo lectura de un primario (directorio de exportación o URL)")
     args = parser.parse_args()
     
     # Importar componentes
@@ -33,6 +47,103 @@ def main():
         config.HOST = args.host
     if args.no_debug:
         config.DEBUG = False
+    if args.replication_dir:
+        config.REPLICATION_DIR = args.replication_dir
+        
+    # Ajuste automático: escribe el perfil que Config carga en los siguientes arranques
+    if args.autotune:
+        from benchmarks.autotune import autotune
+        
+        autotune(config, quick=args.autotune_quick)
+        return
+        
+    # Réplica de solo lectura: carga la instantánea del primario y aplica sus deltas
+    if args.replica_of:
+        from Entrenamiento.replication import Replica
+        
+        if not args.serve or args.load_pdf or args.workers > 0:
+            print("Error: --replica-of solo se puede usar con --serve (sin --load_pdf ni --workers)")
+            return
+            
+        model_manager = ModelManager(config)
+        vector_db = VectorDatabase(config, autoload=False, read_only=True)
+        replica = Replica(
+            args.replica_of,
+            vector_db,
+            poll_interval=config.REPLICA_POLL_INTERVAL,
+            timeout=config.REPLICA_HTTP_TIMEOUT
+        )
+        print(f"Sincronizando réplica con {args.replica_of}...")
+        try:
+            replica.bootstrap()
+        except Exception as e:
+            print(f"Error: no se pudo iniciar la réplica: {str(e)}")
+            return
+        replica.start()
+        
+        model_manager.load_embedding_model()
+        model_manager.load_model()
+        
+        print(f"Iniciando réplica en http://{config.HOST}:{config.PORT} (v{vector_db.version})")
+        server = FlaskService(model_manager, vector_db, config, replica=replica)
+        server.run()
+        return
+    
+    # Servicio de producción con varios procesos
+    if args.serve and args.workers > 0:
+        from Entrenamiento.serving import serve_with_workers
+        
+        if args.load_pdf:
+            if not os.path.exists(args.load_pdf):
+                print(f"Error: El archivo PDF {args.load_pdf} no existe")
+                return
+            # La carga inicial se hace aquí, antes de lanzar el escritor y los workers
+            model_manager = ModelManager(config)
+            vector_db = VectorDatabase(config)
+            print(f"Cargando PDF: {args.load_pdf}")
+            load_pdf_to_db(
+                args.load_pdf,
+                model_manager,
+                vector_db,
+                chunk_size=args.chunk_size,
+                chunk_overlap=args.chunk_overlap
+            )
+        
+        serve_with_workers(config, args.workers)
+        return
+    
+    # Arranque rápido: el servidor escucha de inmediato y los componentes
+    # pesados se cargan en hilos en segundo plano
+    if args.serve and args.fast_start:
+        from Entrenamiento.startup import ComponentLoader
+        
+        model_manager = ModelManager(config)
+        vector_db = VectorDatabase(config, autoload=False)
+        loader = ComponentLoader(started_at=started_at)
+        loader.start("vector_db", vector_db.initialize_db)
+        loader.start("embedding_model", model_manager.load_embedding_model)
+        loader.start("llm", model_manager.load_model)
+        
+        if args.load_pdf:
+            if not os.path.exists(args.load_pdf):
+                print(f"Error: El archivo PDF {args.load_pdf} no existe")
+                return
+            loader.start(
+                "startup_pdf",
+                lambda: load_pdf_to_db(
+                    args.load_pdf,
+                    model_manager,
+                    vector_db,
+                    chunk_size=args.chunk_size,
+                    chunk_overlap=args.chunk_overlap
+                ),
+                after=("embedding_model", "vector_db")
+            )
+        
+        print(f"Iniciando servidor API en http://{config.HOST}:{config.PORT} (carga en segundo plano)")
+        server = FlaskService(model_manager, vector_db, config, loader=loader)
+        server.run()
+        return
     
     # Inicializar componentes
     model_manager = ModelManager(config)